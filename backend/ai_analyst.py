@@ -2,6 +2,7 @@ import google.generativeai as genai
 import os
 import json
 import re
+import asyncio
 from dotenv import load_dotenv
 
 # Try to load .env file if it exists (for local development)
@@ -10,6 +11,12 @@ env_path = Path(__file__).parent / '.env'
 if env_path.exists():
     load_dotenv(dotenv_path=env_path)
 
+# .env yüklendikten sonra (DB ayarları env'den okunur)
+import db
+import cache_service
+import analysis_cache_service
+from google.api_core import exceptions as google_exceptions
+
 # API Ayarları - Cloud Run'da environment variable'dan, local'de .env'den alır
 API_KEY = os.getenv("GEMINI_API_KEY")
 if not API_KEY:
@@ -36,9 +43,24 @@ generation_config = {
 # Model will be initialized dynamically in analyze_article to handle API version differences
 model = None  # Will be created per-request
 
-def analyze_article(title, content_snippet):
-    print(f"Analyzing: {title}")
-    prompt = f"""
+# Use the exact same model that works in rag_service.py
+# rag_service.py successfully uses: models/gemini-2.5-flash
+MODEL_NAME = "models/gemini-1.5-flash"
+
+# build_prompt değişince artırılmalı: eski prompt'un cache'li analizleri geçersiz olur
+PROMPT_VERSION = "v1"
+
+# İçeriğin kendisinden kaynaklanan hatalar: tekrar denemek aynı sonucu verir
+# (geçersiz istek, güvenlik filtresi, JSON olmayan cevap -> response.text / json.loads ValueError)
+CONTENT_ERRORS = (
+    ValueError,
+    google_exceptions.InvalidArgument,
+    genai.types.BlockedPromptException,
+    genai.types.StopCandidateException,
+)
+
+def build_prompt(title, content_snippet):
+    return f"""
     ROL: Sen bilim ve teknoloji konusunda uzman, TÜRK kitleye içerik üreten bir analistsin.
     GÖREV: Aşağıdaki İngilizce metni analiz et ve teknik bir TÜRKÇE rapor oluştur.
     
@@ -61,35 +83,117 @@ def analyze_article(title, content_snippet):
     
     ÖNEMLİ: Sadece JSON döndür. Markdown blokları kullanma.
     """
+
+def _get_model():
+    print(f"Using model: {MODEL_NAME} (same as rag_service)")
+    return genai.GenerativeModel(
+        model_name=MODEL_NAME,
+        generation_config=generation_config
+    )
+
+def parse_response(text):
+    """Strips markdown fences and parses the model's JSON answer."""
+    # Temizlik
+    text = re.sub(r"```json\s*", "", text)
+    text = re.sub(r"```", "", text)
+    text = text.strip()
+    
+    result = json.loads(text)
+    # Liste/metin dönerse içerik hatası say (cache'e ve hafızaya girmesin)
+    if not isinstance(result, dict):
+        raise ValueError(f"Model returned JSON {type(result).__name__}, expected an object")
+    return result
+
+def offline_result(error):
+    return {
+        "summary": f"⚠ AI UPLINK OFFLINE: {str(error)[:50]}...",
+        "aiInsight": "N/A",
+        "action": "RETRY MANUALLY",
+        "tags": ["CONNECTION_LOST"],
+        "impact_score": 0,
+        "trend_label": "OFFLINE",
+        "one_line_hook": "Analysis unavailable."
+    }
+
+def unanalyzable_result(error):
+    return {
+        "summary": f"⚠ AI ANALYSIS FAILED: {str(error)[:50]}...",
+        "aiInsight": "N/A",
+        "action": "RETRY MANUALLY",
+        "tags": ["ANALYSIS_FAILED"],
+        "impact_score": 0,
+        "trend_label": "UNANALYZABLE",
+        "one_line_hook": "Analysis unavailable."
+    }
+
+def failure_result(error):
+    """offline_result for transport / quota / server errors, unanalyzable_result for content errors."""
+    if isinstance(error, CONTENT_ERRORS):
+        return unanalyzable_result(error)
+    return offline_result(error)
+
+def is_offline_result(result):
+    """True for the placeholder offline_result returns when Gemini could not be reached."""
+    return result.get("trend_label") == "OFFLINE"
+
+def is_failed_result(result):
+    """True for either placeholder (offline or content that can't be analyzed)."""
+    return result.get("trend_label") in ("OFFLINE", "UNANALYZABLE")
+
+def _cache_key(title, content_snippet):
+    return analysis_cache_service.make_key(title, content_snippet, PROMPT_VERSION, MODEL_NAME)
+
+def analyze_article(title, content_snippet):
+    key = _cache_key(title, content_snippet)
+    cached = analysis_cache_service.lookup(key)
+    if cached is not None:
+        return cached
+
+    print(f"Analyzing: {title}")
+    prompt = build_prompt(title, content_snippet)
     
     try:
-        # Use the exact same model that works in rag_service.py
-        # rag_service.py successfully uses: models/gemini-2.5-flash
-        model_name = "models/gemini-1.5-flash"
-        
-        # Use the exact same model that works in rag_service.py
-        print(f"Using model: {model_name} (same as rag_service)")
-        current_model = genai.GenerativeModel(
-            model_name=model_name,
-            generation_config=generation_config
-        )
-        response = current_model.generate_content(prompt)
-        text = response.text
-        
-        # Temizlik
-        text = re.sub(r"```json\s*", "", text)
-        text = re.sub(r"```", "", text)
-        text = text.strip()
-        
-        return json.loads(text)
+        response = _get_model().generate_content(prompt)
+        result = parse_response(response.text)
     except Exception as e:
         print(f"AI Error: {e}")
-        return {
-            "summary": f"⚠ AI UPLINK OFFLINE: {str(e)[:50]}...",
-            "aiInsight": "N/A",
-            "action": "RETRY MANUALLY",
-            "tags": ["CONNECTION_LOST"],
-            "impact_score": 0,
-            "trend_label": "OFFLINE",
-            "one_line_hook": "Analysis unavailable."
-        }
+        return failure_result(e)
+    # Hata sonuçları cache'lenmez, sadece başarılı analizler
+    analysis_cache_service.store(key, result, MODEL_NAME, PROMPT_VERSION)
+    return result
+
+async def _analyze_uncached_async(key, title, content_snippet):
+    cached = await db.run_sync(analysis_cache_service.lookup, key)
+    if cached is not None:
+        return cached
+
+    print(f"Analyzing: {title}")
+    prompt = build_prompt(title, content_snippet)
+
+    try:
+        response = await _get_model().generate_content_async(prompt)
+        result = parse_response(response.text)
+    except Exception as e:
+        print(f"AI Error: {e}")
+        return failure_result(e)
+    await db.run_sync(analysis_cache_service.store, key, result, MODEL_NAME, PROMPT_VERSION)
+    return result
+
+async def analyze_article_async(title, content_snippet):
+    """
+    analyze_article'ın async karşılığı (FastAPI event loop'unu bloklamaz).
+    Sıra: bellek katmanı -> aynı makale için süren çağrı -> Postgres -> Gemini.
+    """
+    key = _cache_key(title, content_snippet)
+    cached = analysis_cache_service.get_cached(key)
+    if cached is not None:
+        return cached
+
+    # Aynı makale için eşzamanlı istekler tek Gemini çağrısını bekler
+    task = cache_service.single_flight(
+        f"analysis:{key}", lambda: _analyze_uncached_async(key, title, content_snippet)
+    )
+    # shield: bir istemci bağlantıyı koparsa ortak çağrı iptal olmasın
+    result = await asyncio.shield(task)
+    # Her çağıran kendi kopyasını alır (/scan sonuca 'link' ekliyor)
+    return dict(result)
@@ -0,0 +1,50 @@
+import os
+import json
+import hashlib
+import tiered_cache
+from embedding_cache_service import normalize_text
+
+# --- CONFIG ---
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() != "false"
+# Bellek içi katmanda tutulan analiz sayısı (popüler haberler Postgres'e bile gitmez)
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "512"))
+
+ANALYSIS_CACHE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS analysis_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT,
+        prompt_version TEXT,
+        result JSONB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+]
+
+cache = tiered_cache.TieredCache(
+    "analysis_cache", "result", "Analysis", ANALYSIS_CACHE_MAX_ENTRIES,
+    enabled=ANALYSIS_CACHE_ENABLED,
+    # JSONB kolonuna metin olarak yazılır; her çağıran kendi kopyasını alır (/scan sonuca 'link' ekliyor)
+    encode=lambda result: json.dumps(result, ensure_ascii=False),
+    copy=dict,
+)
+
+def make_key(title, content, prompt_version, model):
+    payload = "\x1f".join([model, prompt_version, normalize_text(title), normalize_text(content)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def ensure_analysis_cache_table():
+    """Creates the analysis_cache table if it doesn't exist."""
+    return tiered_cache.ensure_table(ANALYSIS_CACHE_DDL, "Analysis")
+
+def get_cached(key):
+    """In-memory tier only (no I/O, safe to call on the event loop). Returns a copy."""
+    return cache.get_cached(key)
+
+def lookup(key):
+    """Memory tier, then Postgres. Returns a copy."""
+    return cache.lookup(key)
+
+def store(key, result, model, prompt_version):
+    """Writes both tiers (see TieredCache.store_many)."""
+    cache.store(key, result, model=model, prompt_version=prompt_version)
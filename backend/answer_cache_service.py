@@ -0,0 +1,91 @@
+import os
+import time
+import threading
+import numpy as np
+
+# --- CONFIG ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() != "false"
+# İki soru bu cosine mesafesinin altındaysa "aynı soru" sayılır
+ANSWER_CACHE_MAX_DISTANCE = float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.05"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+def _unit(vector):
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+class AnswerCache:
+    """
+    Semantic cache for RAG answers.
+    An entry is (question vector, retrieved doc ids, weakest retrieved similarity, answer).
+    A lookup hits when a cached question is within ANSWER_CACHE_MAX_DISTANCE and the new
+    retrieval returned the same documents, so the prompt Gemini would see is unchanged.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def _live_entries(self):
+        cutoff = time.time() - ANSWER_CACHE_TTL_SECONDS
+        self._entries = [e for e in self._entries if e["created"] > cutoff]
+        return self._entries
+
+    def lookup(self, question_vector, doc_ids):
+        """Cached answer or None."""
+        if not ANSWER_CACHE_ENABLED:
+            return None
+        with self._lock:
+            entries = list(self._live_entries())
+        if not entries:
+            return None
+        query = _unit(question_vector)
+        similarities = np.stack([e["vector"] for e in entries]) @ query
+        wanted = tuple(doc_ids)
+        for i in np.argsort(-similarities):
+            if 1.0 - similarities[i] > ANSWER_CACHE_MAX_DISTANCE:
+                break
+            if entries[i]["doc_ids"] == wanted:
+                return entries[i]["answer"]
+        return None
+
+    def store(self, question_vector, doc_ids, min_score, answer):
+        if not ANSWER_CACHE_ENABLED or not answer:
+            return
+        entry = {
+            "vector": _unit(question_vector),
+            "doc_ids": tuple(doc_ids),
+            # Yeni bir doküman bu benzerliği geçerse top-k değişir -> entry geçersiz
+            "min_score": min_score if doc_ids else -1.0,
+            "created": time.time(),
+            "answer": answer,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+
+    def invalidate_for(self, doc_vector):
+        """
+        Drops every entry whose top-k the new memory would enter
+        (its similarity to the cached question beats the weakest retrieved doc).
+        Returns how many entries were dropped.
+        """
+        with self._lock:
+            if not self._entries:
+                return 0
+            doc = _unit(doc_vector)
+            similarities = np.stack([e["vector"] for e in self._entries]) @ doc
+            kept = [e for e, sim in zip(self._entries, similarities) if sim < e["min_score"]]
+            dropped = len(self._entries) - len(kept)
+            self._entries = kept
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+
+# Process-wide cache
+cache = AnswerCache()
@@ -0,0 +1,71 @@
+import asyncio
+import argparse
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=Path(__file__).parent / '.env')
+
+import db
+import memory_service
+import graph_service
+from embedding_service import generate_embeddings_async
+
+# Her turda taranan satır sayısı (embedding istekleri bunun içinde EMBED_BATCH_SIZE'lık parçalara bölünür)
+SCAN_PAGE_SIZE = 500
+
+async def backfill(api_url=None):
+    """
+    Re-embeds every agent_memory row that still carries a placeholder vector
+    (NULL, wrong dimension or a constant filler like [0.1]*768), then rebuilds the kNN graph
+    (it lives in the database). The API's in-process state (local vector index, answer cache,
+    graph responses) is refreshed through POST /admin/refresh-memory when api_url is given;
+    it belongs to each running instance, not to this script.
+    """
+    after_id = 0
+    scanned_pages = 0
+    total_updated = 0
+    total_failed = 0
+
+    while True:
+        rows, last_id = await db.run_sync(memory_service.find_placeholder_rows, after_id, SCAN_PAGE_SIZE)
+        if last_id is None:
+            break
+        after_id = last_id
+        scanned_pages += 1
+        if not rows:
+            continue
+
+        vectors = await generate_embeddings_async([content for _, content in rows])
+        updates = [(mem_id, vector) for (mem_id, _), vector in zip(rows, vectors) if vector]
+        total_failed += len(rows) - len(updates)
+        total_updated += await db.run_sync(memory_service.update_embeddings, updates)
+        print(f"  ...up to id {last_id}: {len(updates)}/{len(rows)} re-embedded")
+
+    print(f"✅ Backfill done: {total_updated} updated, {total_failed} failed ({scanned_pages} pages scanned).")
+    if not total_updated:
+        return
+    graph = await db.run_sync(graph_service.rebuild_graph)
+    print(f"  ...graph rebuilt: {graph}")
+    if api_url:
+        await asyncio.to_thread(refresh_api, api_url)
+    else:
+        print("  ...API state not refreshed: call POST /admin/refresh-memory on each instance (or pass --api-url).")
+
+def refresh_api(api_url):
+    """Asks a running API instance to rebuild its in-process state from the re-embedded rows."""
+    import requests
+    try:
+        response = requests.post(f"{api_url.rstrip('/')}/admin/refresh-memory", timeout=120)
+        response.raise_for_status()
+        print(f"  ...API state refreshed: {response.json()}")
+    except Exception as e:
+        print(f"  ...API refresh failed ({e}): call POST /admin/refresh-memory manually.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-embed agent_memory rows that carry placeholder vectors")
+    parser.add_argument("--api-url", help="Running API to refresh afterwards (e.g. http://localhost:8001)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(backfill(args.api_url))
+    finally:
+        db.close_pool()
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+# --- CONFIG ---
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() != "false"
+# Ayarlanırsa yanıtlar Redis'te tutulur (birden fazla Cloud Run instance'ı aynı cache'i görür)
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+# TTL dolduktan sonra bu kadar süre daha bayat yanıt dönülür, arkada yenilenir (saniye)
+CACHE_STALE_SECONDS = float(os.getenv("CACHE_STALE_SECONDS", "300"))
+CACHE_KEY_PREFIX = "nomad:cache:"
+GENERATION_KEY_PREFIX = "nomad:cache-gen:"
+
+# Endpoint başına taze kalma süreleri (saniye). CACHE_TTL_<NAME> env ile ezilebilir.
+DEFAULT_TTLS = {
+    "feeds": 30,
+    "trends": 120,
+    "stats": 30,
+    "categories": 300,
+    "graph": 60,
+}
+
+def ttl_for(namespace):
+    return float(os.getenv(f"CACHE_TTL_{namespace.upper()}", DEFAULT_TTLS.get(namespace, 60)))
+
+class LRUCache:
+    """Small thread-safe LRU map: get() refreshes recency, set() evicts the oldest entry past max_size."""
+
+    def __init__(self, max_size=CACHE_MAX_ENTRIES):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+# --- BACKENDS ---
+# Entry formatı: {"value": ..., "fresh_until": epoch, "stale_until": epoch}
+# Namespace generation: invalidate() artırır; hesaplama başlarken okunan değer yazarken
+# değişmişse sonuç yazmadan önceki veriyi görmüş olabilir, cache'e konmaz.
+
+class MemoryBackend:
+    """Per-process LRU. Values are kept as-is, so callers must not mutate what they get back."""
+
+    name = "memory"
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self._lru = LRUCache(max_entries)
+        self._generations = {}
+
+    async def get(self, key):
+        entry = self._lru.get(key)
+        if entry and entry["stale_until"] < time.time():
+            self._lru.pop(key)
+            return None
+        return entry
+
+    async def set(self, key, entry):
+        self._lru.set(key, entry)
+
+    async def delete_prefix(self, prefix):
+        for key in self._lru.keys():
+            if key.startswith(prefix):
+                self._lru.pop(key)
+
+    async def generation(self, namespace):
+        return self._generations.get(namespace, 0)
+
+    async def bump_generation(self, namespace):
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+class RedisBackend:
+    """Shared backend for multi-instance deployments. Values must be JSON serializable."""
+
+    name = "redis"
+
+    def __init__(self, url):
+        import redis.asyncio as redis_async
+        self._client = redis_async.from_url(url)
+
+    async def get(self, key):
+        raw = await self._client.get(CACHE_KEY_PREFIX + key)
+        return json.loads(raw) if raw else None
+
+    async def set(self, key, entry):
+        expire = max(1, int(entry["stale_until"] - time.time()))
+        await self._client.set(CACHE_KEY_PREFIX + key, json.dumps(entry), ex=expire)
+
+    async def delete_prefix(self, prefix):
+        keys = [k async for k in self._client.scan_iter(match=f"{CACHE_KEY_PREFIX}{prefix}*")]
+        if keys:
+            await self._client.delete(*keys)
+
+    async def generation(self, namespace):
+        raw = await self._client.get(GENERATION_KEY_PREFIX + namespace)
+        return int(raw) if raw else 0
+
+    async def bump_generation(self, namespace):
+        await self._client.incr(GENERATION_KEY_PREFIX + namespace)
+
+def _create_backend():
+    if REDIS_URL:
+        try:
+            backend = RedisBackend(REDIS_URL)
+            print("🧠 Response cache: redis")
+            return backend
+        except ImportError:
+            print("UYARI: REDIS_URL ayarlı ama 'redis' paketi yok, bellek içi cache kullanılıyor.")
+    return MemoryBackend()
+
+_backend = None
+_inflight = {}
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = _create_backend()
+    return _backend
+
+def make_key(namespace, **params):
+    """Stable key for an endpoint call: 'feeds:{"category": "ALL", ...}'."""
+    return f"{namespace}:{json.dumps(params, sort_keys=True, default=str)}"
+
+class Uncached:
+    """Wraps a compute result that must be returned but not stored (error fallbacks)."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+def uncached(value):
+    """Marks a fallback result: get_or_compute returns value but never caches it.
+
+        except Exception as e:
+            print(f"Article Read Error: {e}")
+            return cache_service.uncached([])
+    """
+    return Uncached(value)
+
+def unwrap(value):
+    """The plain value of a compute result (for callers that bypass the cache)."""
+    return value.value if isinstance(value, Uncached) else value
+
+# --- API ---
+
+async def _compute_and_store(namespace, key, compute, ttl, stale_seconds):
+    backend = get_backend()
+    try:
+        generation = await backend.generation(namespace)
+    except Exception as e:
+        print(f"Cache Read Error: {e}")
+        generation = None
+    value = await compute()
+    if isinstance(value, Uncached):
+        return value.value
+    try:
+        # Hesaplama sürerken invalidate geldiyse sonuç eski veriyi yansıtıyor olabilir
+        if generation is None or await backend.generation(namespace) != generation:
+            return value
+        now = time.time()
+        entry = {"value": value, "fresh_until": now + ttl, "stale_until": now + ttl + stale_seconds}
+        await backend.set(key, entry)
+    except Exception as e:
+        print(f"Cache Write Error: {e}")
+    return value
+
+def single_flight(key, start):
+    """
+    Returns the in-flight task for key, starting start() (a zero-arg coroutine function)
+    if nobody is running it yet; concurrent callers await the same task.
+    Keys share one table with get_or_compute, so prefix them ('analysis:<hash>').
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(start())
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key, None) if _inflight.get(key) is t else None)
+    return task
+
+def _refresh(namespace, key, compute, ttl, stale_seconds):
+    return single_flight(key, lambda: _compute_and_store(namespace, key, compute, ttl, stale_seconds))
+
+def _log_refresh_error(task):
+    if not task.cancelled() and task.exception():
+        print(f"Cache Refresh Error: {task.exception()}")
+
+async def get_or_compute(namespace, compute, ttl=None, stale_seconds=CACHE_STALE_SECONDS, **params):
+    """
+    Cached endpoint result for namespace + params.
+
+    - fresh hit: returned immediately
+    - stale hit: returned immediately, one background refresh is started
+    - miss: computed once; concurrent callers for the same key await the same computation
+
+    compute is a zero-arg coroutine function. Errors and uncached(...) fallbacks are not cached,
+    nor is a result whose computation overlapped an invalidate() of the namespace.
+
+        return await cache_service.get_or_compute("feeds", lambda: load(...), category=category)
+    """
+    if not CACHE_ENABLED:
+        return unwrap(await compute())
+
+    ttl = ttl_for(namespace) if ttl is None else ttl
+    key = make_key(namespace, **params)
+
+    try:
+        entry = await get_backend().get(key)
+    except Exception as e:
+        print(f"Cache Read Error: {e}")
+        entry = None
+
+    if entry:
+        if entry["fresh_until"] >= time.time():
+            return entry["value"]
+        # Bayat: eskiyi dön, yenilemeyi arkada başlat
+        if key not in _inflight:
+            _refresh(namespace, key, compute, ttl, stale_seconds).add_done_callback(_log_refresh_error)
+        return entry["value"]
+
+    # shield: bir istemci bağlantıyı koparsa ortak hesaplama iptal olmasın
+    return await asyncio.shield(_refresh(namespace, key, compute, ttl, stale_seconds))
+
+async def invalidate(*namespaces):
+    """
+    Drops every cached entry of the given namespaces (call after writes).
+    Computations already running are detached: they finish for their own callers
+    but don't store, and later callers start a fresh one.
+    """
+    if not CACHE_ENABLED:
+        return
+    for namespace in namespaces:
+        prefix = f"{namespace}:"
+        for key in [k for k in _inflight if k.startswith(prefix)]:
+            _inflight.pop(key, None)
+        try:
+            await get_backend().bump_generation(namespace)
+            await get_backend().delete_prefix(prefix)
+        except Exception as e:
+            print(f"Cache Invalidate Error: {e}")
@@ -0,0 +1,70 @@
+import os
+import hashlib
+import unicodedata
+import tiered_cache
+
+# --- CONFIG ---
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() != "false"
+# Bellek içi katmanda tutulan vektör sayısı (768 float ~ 6 KB/adet)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "2048"))
+# Son sorulan soruların vektörleri (sohbetteki takip soruları embedding çağrısı yapmaz)
+QUERY_HOT_SET_SIZE = int(os.getenv("QUERY_HOT_SET_SIZE", "256"))
+QUERY_TASK = "retrieval_query"
+
+EMBEDDING_CACHE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS embedding_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT,
+        task_type TEXT,
+        embedding REAL[] NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+]
+
+# Task type başına ayrı bellek katmanı: sorgular doküman vektörlerini LRU'dan itmesin
+_tiers = {}
+
+def _tier(task_type):
+    tier = _tiers.get(task_type)
+    if tier is None:
+        size = QUERY_HOT_SET_SIZE if task_type == QUERY_TASK else EMBEDDING_CACHE_MAX_ENTRIES
+        tier = _tiers.setdefault(task_type, tiered_cache.TieredCache(
+            "embedding_cache", "embedding", "Embedding", size,
+            enabled=EMBEDDING_CACHE_ENABLED,
+            encode=lambda vector: [float(x) for x in vector],
+        ))
+    return tier
+
+def normalize_text(text):
+    """Unicode NFC + collapsed whitespace, so trivially different copies share one vector."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+def make_key(text, model, task_type, title=None):
+    payload = "\x1f".join([model, task_type, title or "", normalize_text(text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def ensure_embedding_cache_table():
+    """Creates the embedding_cache table if it doesn't exist."""
+    return tiered_cache.ensure_table(EMBEDDING_CACHE_DDL, "Embedding")
+
+def get_cached(key, task_type):
+    """In-memory tier only (no I/O, safe to call on the event loop)."""
+    return _tier(task_type).get_cached(key)
+
+def lookup(key, task_type):
+    """Memory tier, then Postgres."""
+    return _tier(task_type).lookup(key)
+
+def store(key, vector, model, task_type):
+    """Writes both tiers (see TieredCache.store_many)."""
+    _tier(task_type).store(key, vector, model=model, task_type=task_type)
+
+def lookup_many(keys, task_type):
+    """Batch lookup: {key: vector} for every key found in either tier."""
+    return _tier(task_type).lookup_many(keys)
+
+def store_many(entries, model, task_type):
+    """entries: {key: vector}. One INSERT statement for the whole batch."""
+    _tier(task_type).store_many(entries, model=model, task_type=task_type)
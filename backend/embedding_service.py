@@ -1,6 +1,10 @@
 import os
+import time
+import asyncio
 import google.generativeai as genai
 from dotenv import load_dotenv
+import db
+import embedding_cache_service
 
 # .env yükle (API anahtarı için)
 load_dotenv()
@@ -15,27 +19,172 @@ if not API_KEY:
 else:
     genai.configure(api_key=API_KEY)
 
-def generate_embedding(text: str):
-    """
-    Verilen metnin Gemini text-embedding-004 modelini kullanarak
-    vektör karşılığını (embedding) döndürür.
-    """
+EMBEDDING_MODEL = "models/text-embedding-004"
+DOCUMENT_TASK = "retrieval_document"
+DOCUMENT_TITLE = "Nomad Memory"
+
+# Toplu embedding: Gemini tek istekte en fazla 100 metin kabul eder
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+# Dakikadaki istek bütçesi (kota aşımında 429 yememek için)
+EMBED_REQUESTS_PER_MINUTE = float(os.getenv("EMBED_REQUESTS_PER_MINUTE", "120"))
+
+QUERY_TASK = embedding_cache_service.QUERY_TASK
+
+def _embed(text, task_type, title):
+    """Cache-first single embedding (sync). title is only sent for documents."""
+    key = embedding_cache_service.make_key(text, EMBEDDING_MODEL, task_type, title)
+    cached = embedding_cache_service.lookup(key, task_type)
+    if cached is not None:
+        return cached
+
     try:
         if not API_KEY:
             raise ValueError("API Key eksik.")
-            
-        # text-embedding-004 modeli, retrieval_document task type'ı ile dökümanları vektörleştirir.
+
         result = genai.embed_content(
-            model="models/text-embedding-004",
+            model=EMBEDDING_MODEL,
             content=text,
-            task_type="retrieval_document",
-            title="Nomad Memory"
+            task_type=task_type,
+            title=title
         )
-        return result['embedding']
+        vector = result['embedding']
     except Exception as e:
         print(f"Embedding Üretme Hatası: {e}")
         return None
 
+    embedding_cache_service.store(key, vector, EMBEDDING_MODEL, task_type)
+    return vector
+
+async def _embed_async(text, task_type, title):
+    key = embedding_cache_service.make_key(text, EMBEDDING_MODEL, task_type, title)
+    # Bellek katmanı (sorgular için sıcak küme) I/O'suz kontrol edilir
+    cached = embedding_cache_service.get_cached(key, task_type)
+    if cached is None:
+        cached = await db.run_sync(embedding_cache_service.lookup, key, task_type)
+    if cached is not None:
+        return cached
+
+    try:
+        if not API_KEY:
+            raise ValueError("API Key eksik.")
+
+        result = await genai.embed_content_async(
+            model=EMBEDDING_MODEL,
+            content=text,
+            task_type=task_type,
+            title=title
+        )
+        vector = result['embedding']
+    except Exception as e:
+        print(f"Embedding Üretme Hatası: {e}")
+        return None
+
+    await db.run_sync(embedding_cache_service.store, key, vector, EMBEDDING_MODEL, task_type)
+    return vector
+
+def embed_document(text: str):
+    """
+    Hafızaya yazılacak metnin vektörü (retrieval_document, başlık: "Nomad Memory").
+    Aynı metin daha önce vektörleştirildiyse cache'ten döner, API çağrılmaz.
+    """
+    return _embed(text, DOCUMENT_TASK, DOCUMENT_TITLE)
+
+async def embed_document_async(text: str):
+    """embed_document'in async karşılığı (FastAPI event loop'unu bloklamaz)."""
+    return await _embed_async(text, DOCUMENT_TASK, DOCUMENT_TITLE)
+
+def embed_query(text: str):
+    """
+    Arama sorusunun vektörü (retrieval_query). Doküman vektörleriyle aynı uzaydadır
+    ama soru-cevap eşleşmesi için optimize edilmiştir.
+    """
+    return _embed(text, QUERY_TASK, None)
+
+async def embed_query_async(text: str):
+    """embed_query'nin async karşılığı; son soruların vektörleri bellekte hazır tutulur."""
+    return await _embed_async(text, QUERY_TASK, None)
+
+# Eski isimler: hafıza dokümanı embedding'i
+generate_embedding = embed_document
+generate_embedding_async = embed_document_async
+
+class RateLimiter:
+    """Spaces request starts evenly: at most `per_minute` starts in any minute (per event loop)."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0
+        self._next = 0.0
+        self._lock = None
+
+    async def wait(self):
+        if not self.interval:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def _embed_chunk(texts, semaphore, limiter):
+    async with semaphore:
+        await limiter.wait()
+        result = await genai.embed_content_async(
+            model=EMBEDDING_MODEL,
+            content=texts,
+            task_type=DOCUMENT_TASK,
+            title=DOCUMENT_TITLE
+        )
+    return result['embedding']
+
+async def generate_embeddings_async(texts):
+    """
+    Toplu embedding: sonuçlar girişle aynı sırada döner (başarısız olanlar None).
+    Cache'te olanlar API'ye gitmez, tekrar eden metinler bir kez gönderilir,
+    kalanlar EMBED_BATCH_SIZE'lık parçalar halinde sınırlı eşzamanlılık ve hız bütçesiyle işlenir.
+    """
+    if not texts:
+        return []
+    keys = [embedding_cache_service.make_key(t, EMBEDDING_MODEL, DOCUMENT_TASK, DOCUMENT_TITLE) for t in texts]
+    vectors = await db.run_sync(embedding_cache_service.lookup_many, keys, DOCUMENT_TASK)
+
+    pending = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors and key not in pending:
+            pending[key] = text
+
+    if pending:
+        if not API_KEY:
+            print("Embedding Üretme Hatası: API Key eksik.")
+            return [vectors.get(k) for k in keys]
+
+        pending_keys = list(pending)
+        chunks = [pending_keys[i:i + EMBED_BATCH_SIZE] for i in range(0, len(pending_keys), EMBED_BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+        limiter = RateLimiter(EMBED_REQUESTS_PER_MINUTE)
+        results = await asyncio.gather(
+            *[_embed_chunk([pending[k] for k in chunk], semaphore, limiter) for chunk in chunks],
+            return_exceptions=True
+        )
+
+        fresh = {}
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                print(f"Toplu Embedding Hatası ({len(chunk)} metin): {result}")
+                continue
+            fresh.update(zip(chunk, result))
+        await db.run_sync(embedding_cache_service.store_many, fresh, EMBEDDING_MODEL, DOCUMENT_TASK)
+        vectors.update(fresh)
+
+    return [vectors.get(k) for k in keys]
+
+def generate_embeddings(texts):
+    """generate_embeddings_async'in senkron sarmalayıcısı (CLI script'leri için)."""
+    return asyncio.run(generate_embeddings_async(texts))
+
 if __name__ == "__main__":
     # Test Bloğu
     print("🌉 Babil Kulesi (Embedding Bridge) Test Ediliyor...")
@@ -0,0 +1,204 @@
+import os
+import json
+import asyncio
+import datetime
+from psycopg2.extras import execute_values
+import db
+import ai_analyst
+import cache_service
+import memory_service
+from embedding_service import RateLimiter
+
+# --- CONFIG ---
+# Yeni haberleri arka planda analiz eden aşama (impact_score / tags / trend_label)
+ENRICH_ENABLED = os.getenv("ENRICH_ENABLED", "true").lower() != "false"
+ENRICH_INTERVAL_SECONDS = int(os.getenv("ENRICH_INTERVAL_SECONDS", "60"))
+# Her turda sahiplenilen haber sayısı ve aynı anda süren Gemini çağrısı sayısı
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", "20"))
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", "3"))
+# Kota bütçesi: dakikada en fazla bu kadar analiz başlatılır (kullanıcı /analyze'larına pay kalsın)
+ENRICH_REQUESTS_PER_MINUTE = int(os.getenv("ENRICH_REQUESTS_PER_MINUTE", "20"))
+# Sahiplenilip bu sürede bitirilemeyen (instance öldü, Gemini offline) haberler tekrar denenir
+ENRICH_CLAIM_TIMEOUT_MINUTES = int(os.getenv("ENRICH_CLAIM_TIMEOUT_MINUTES", "10"))
+# Bu kadar sahiplenmede analiz edilemeyen haber (bozuk içerik, instance'ı düşüren girdi) bir daha denenmez
+ENRICH_MAX_ATTEMPTS = int(os.getenv("ENRICH_MAX_ATTEMPTS", "3"))
+
+_worker_task = None
+_wake = None
+last_cycle = {"started_at": None, "finished_at": None, "analyzed": 0, "failed": 0, "error": None}
+
+# --- STORAGE ---
+
+def claim_articles(limit=ENRICH_BATCH_SIZE):
+    """
+    Atomically claims up to `limit` unanalyzed articles, newest first.
+    SKIP LOCKED + the claim timestamp keep several instances from analyzing the same rows.
+    Every claim counts as an attempt, so a row that keeps crashing its worker still runs out.
+    """
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE articles SET enrich_claimed_at = now(), enrich_attempts = enrich_attempts + 1
+            WHERE id IN (
+                SELECT id FROM articles
+                WHERE analyzed_at IS NULL AND enrich_failed_at IS NULL
+                  AND enrich_attempts < %s
+                  AND (enrich_claimed_at IS NULL OR enrich_claimed_at < now() - make_interval(mins => %s))
+                ORDER BY fetched_at DESC
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, title, summary
+        """, (ENRICH_MAX_ATTEMPTS, ENRICH_CLAIM_TIMEOUT_MINUTES, limit))
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+def release_failed(article_ids, refund=False):
+    """
+    Handles articles whose analysis failed. refund=True (Gemini unreachable: transport,
+    quota or server error, not the article's fault) gives the attempt back and drops the claim; otherwise
+    rows that used up ENRICH_MAX_ATTEMPTS get enrich_failed_at and are never claimed again.
+    Returns the number of rows marked as failed.
+    """
+    if not article_ids:
+        return 0
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        if refund:
+            cur.execute("""
+                UPDATE articles SET enrich_attempts = GREATEST(enrich_attempts - 1, 0), enrich_claimed_at = NULL
+                WHERE id = ANY(%s)
+            """, (list(article_ids),))
+            marked = 0
+        else:
+            cur.execute("""
+                UPDATE articles SET enrich_failed_at = now()
+                WHERE id = ANY(%s) AND enrich_attempts >= %s
+            """, (list(article_ids), ENRICH_MAX_ATTEMPTS))
+            marked = cur.rowcount
+        cur.close()
+    return marked
+
+def store_analyses(results):
+    """
+    results: [(article_id, ai_analyst result)]. Persists the full analysis plus the
+    filterable columns in one statement. Returns the number of rows updated.
+    """
+    if not results:
+        return 0
+    now = datetime.datetime.now()
+    rows = []
+    for article_id, analysis in results:
+        # Model bazen listeyi "AI, SECURITY" gibi tek metin ya da null döndürür
+        analysis = dict(analysis, tags=memory_service.coerce_tags(analysis.get("tags")))
+        fields = memory_service.memory_fields("", analysis)
+        rows.append((
+            article_id,
+            json.dumps(analysis, ensure_ascii=False),
+            fields["impact_score"],
+            fields["tags"],
+            fields["trend_label"],
+            now,
+        ))
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        execute_values(cur, """
+            UPDATE articles SET
+                analysis = v.analysis,
+                impact_score = v.impact_score,
+                tags = v.tags,
+                trend_label = v.trend_label,
+                analyzed_at = v.analyzed_at
+            FROM (VALUES %s) AS v(id, analysis, impact_score, tags, trend_label, analyzed_at)
+            WHERE articles.id = v.id
+        """, rows, template="(%s, %s::jsonb, %s::integer, %s::text[], %s, %s::timestamp)")
+        updated = cur.rowcount
+        cur.close()
+    return updated
+
+# --- WORKER ---
+
+async def _analyze(row, semaphore, limiter):
+    article_id, title, summary = row
+    async with semaphore:
+        await limiter.wait()
+        return await ai_analyst.analyze_article_async(title or "", summary or "")
+
+async def run_enrichment_cycle(limiter):
+    """Claims and analyzes batches until the backlog is empty (or Gemini stops answering)."""
+    last_cycle["started_at"] = datetime.datetime.now().isoformat()
+    analyzed = failed = 0
+    semaphore = asyncio.Semaphore(ENRICH_CONCURRENCY)
+    try:
+        while True:
+            rows = await db.run_sync(claim_articles, ENRICH_BATCH_SIZE)
+            if not rows:
+                break
+            outcomes = await asyncio.gather(*[_analyze(r, semaphore, limiter) for r in rows], return_exceptions=True)
+            results, failed_ids, offline_ids = [], [], []
+            for (article_id, _, _), outcome in zip(rows, outcomes):
+                if isinstance(outcome, Exception):
+                    print(f"Enrichment Analyze Error ({article_id}): {outcome}")
+                    failed_ids.append(article_id)
+                elif ai_analyst.is_offline_result(outcome):
+                    offline_ids.append(article_id)
+                elif ai_analyst.is_failed_result(outcome):
+                    failed_ids.append(article_id)
+                else:
+                    results.append((article_id, outcome))
+            failed += len(failed_ids) + len(offline_ids)
+            if results:
+                analyzed += await db.run_sync(store_analyses, results)
+                await cache_service.invalidate("feeds")
+            # İçerik hataları deneme hakkı yer; Gemini'ye ulaşılamayanlar hakkını geri alır
+            await db.run_sync(release_failed, failed_ids)
+            await db.run_sync(release_failed, offline_ids, True)
+            if offline_ids:
+                break  # Gemini ulaşılamıyor / kota: bir sonraki tura bırak
+        last_cycle["error"] = None
+        if analyzed or failed:
+            print(f"🧠 Enrichment cycle done: {analyzed} analyzed, {failed} failed.")
+    except Exception as e:
+        last_cycle["error"] = str(e)
+        print(f"Enrichment Error: {e}")
+    finally:
+        last_cycle["analyzed"], last_cycle["failed"] = analyzed, failed
+        last_cycle["finished_at"] = datetime.datetime.now().isoformat()
+
+async def enrichment_loop(interval=ENRICH_INTERVAL_SECONDS):
+    """Runs every `interval` seconds, or right away when the ingestion worker stored new articles."""
+    limiter = RateLimiter(ENRICH_REQUESTS_PER_MINUTE)
+    while True:
+        await run_enrichment_cycle(limiter)
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        _wake.clear()
+
+def wake():
+    """Signals the worker that new articles are waiting (no-op when it isn't running)."""
+    if _wake is not None:
+        _wake.set()
+
+def start():
+    """Starts the background enrichment worker (idempotent)."""
+    global _worker_task, _wake
+    if not ENRICH_ENABLED:
+        print("Enrichment worker disabled (ENRICH_ENABLED=false).")
+        return
+    if _worker_task is None or _worker_task.done():
+        _wake = asyncio.Event()
+        _worker_task = asyncio.get_running_loop().create_task(enrichment_loop())
+
+async def stop():
+    global _worker_task, _wake
+    if _worker_task:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
+    _wake = None
@@ -0,0 +1,98 @@
+import os
+import random
+import asyncio
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+import aiohttp
+
+# --- CONFIG ---
+# Aynı anda uçuşta olabilecek toplam istek ve domain başına istek sayısı
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "32"))
+FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", "4"))
+# Geçici hatalarda (timeout, bağlantı, 429, 5xx) kaç kez tekrar denenecek
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "2"))
+FETCH_BACKOFF_BASE = float(os.getenv("FETCH_BACKOFF_BASE", "0.5"))
+FETCH_BACKOFF_MAX = float(os.getenv("FETCH_BACKOFF_MAX", "8"))
+DNS_CACHE_TTL = int(os.getenv("DNS_CACHE_TTL", "300"))
+KEEPALIVE_SECONDS = float(os.getenv("KEEPALIVE_SECONDS", "30"))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+def create_session():
+    """
+    One ClientSession per fetch cycle, shared by feed and OG requests.
+    The connector caches DNS lookups and keeps connections alive between requests to the same host.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=FETCH_CONCURRENCY,
+        limit_per_host=FETCH_PER_HOST,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_SECONDS,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+# Status, headers and body of a finished request (the response itself is already released)
+FetchResult = namedtuple("FetchResult", ["status", "headers", "body"])
+
+class FetchScheduler:
+    """
+    Bounds outbound HTTP: a global in-flight limit, a per-domain limit and
+    jittered exponential backoff for transient failures.
+    Create one per event loop (e.g. per fetch cycle); the semaphores belong to that loop.
+    """
+
+    def __init__(self, max_in_flight=FETCH_CONCURRENCY, per_host=FETCH_PER_HOST,
+                 retries=FETCH_RETRIES, backoff_base=FETCH_BACKOFF_BASE, backoff_max=FETCH_BACKOFF_MAX):
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._global = asyncio.Semaphore(max_in_flight)
+        self._hosts = {}
+
+    @asynccontextmanager
+    async def slot(self, url):
+        """Holds a per-host slot, then a global slot, for the duration of the block."""
+        host = urlparse(url).netloc
+        host_sem = self._hosts.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with host_sem:
+            async with self._global:
+                yield
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # Full jitter: 0 .. base * 2^attempt
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def fetch(self, session, url, headers=None, timeout=10, as_text=False):
+        """
+        GETs url inside a scheduler slot and returns a FetchResult.
+        Timeouts, connection errors, 429 and 5xx are retried; the last error is raised
+        (or the last retryable response returned) once retries run out.
+        The slot is released while backing off so other hosts keep moving.
+        """
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                async with self.slot(url):
+                    async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                        body = await (response.text() if as_text else response.read())
+                        result = FetchResult(response.status, response.headers, body)
+                if result.status not in RETRYABLE_STATUSES or attempt >= self.retries:
+                    return result
+                retry_after = _parse_retry_after(result.headers.get('Retry-After'))
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= self.retries:
+                    raise
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+def _parse_retry_after(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        # HTTP-date formatını takip etmiyoruz, normal backoff uygulanır
+        return None
@@ -0,0 +1,517 @@
+import os
+import json
+import math
+import numpy as np
+from psycopg2.extras import execute_values
+import db
+import memory_service
+import vector_index
+
+# --- CONFIG ---
+# Her node için saklanan en yakın komşu sayısı ve bağ için gereken minimum cosine benzerliği
+GRAPH_K = int(os.getenv("GRAPH_K", "5"))
+GRAPH_MIN_SIMILARITY = float(os.getenv("GRAPH_MIN_SIMILARITY", "0.7"))
+# Toplu hesaplamada bir seferde çarpılan satır sayısı (bellek: batch x N float32)
+GRAPH_BATCH_SIZE = int(os.getenv("GRAPH_BATCH_SIZE", "256"))
+GRAPH_MAX_NODES = int(os.getenv("GRAPH_MAX_NODES", "2000"))
+# Bu kadar kayıttan büyük hafızalar varsayılan olarak cluster (süper-node) seviyesinde gösterilir
+GRAPH_LOD_THRESHOLD = int(os.getenv("GRAPH_LOD_THRESHOLD", "500"))
+# k-means hedef cluster büyüklüğü (cluster sayısı = kayıt / bu değer)
+GRAPH_CLUSTER_SIZE = int(os.getenv("GRAPH_CLUSTER_SIZE", "40"))
+# Delta bundan fazla değişiklik içeriyorsa tam graf gönderilir
+GRAPH_MAX_DELTA = int(os.getenv("GRAPH_MAX_DELTA", "5000"))
+GRAPH_CHANGES_RETENTION_HOURS = int(os.getenv("GRAPH_CHANGES_RETENTION_HOURS", "168"))
+# Versiyonlar commit sırasına göre değil insert sırasına göre artar; geç commit olan bir değişikliği
+# kaçırmamak için delta son birkaç versiyonu tekrar okur (birleştirme idempotent)
+GRAPH_DELTA_OVERLAP = 32
+
+EDGES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS memory_edges (
+        source_id INTEGER NOT NULL REFERENCES agent_memory(id) ON DELETE CASCADE,
+        target_id INTEGER NOT NULL REFERENCES agent_memory(id) ON DELETE CASCADE,
+        similarity REAL NOT NULL,
+        PRIMARY KEY (source_id, target_id)
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_memory_edges_target ON memory_edges(target_id);",
+    "ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS cluster_id INTEGER;",
+    "CREATE INDEX IF NOT EXISTS idx_agent_memory_cluster ON agent_memory(cluster_id);",
+    # Node/edge değişiklik günlüğü: ?since=<version> delta'ları buradan okunur
+    """
+    CREATE TABLE IF NOT EXISTS graph_changes (
+        version BIGSERIAL PRIMARY KEY,
+        kind TEXT NOT NULL,
+        source_id INTEGER,
+        target_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+]
+
+GRAPH_CHANGES_FUNCTION_DDL = """
+    CREATE OR REPLACE FUNCTION graph_changes_log() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            INSERT INTO graph_changes (kind) VALUES ('reset');
+        ELSIF TG_TABLE_NAME = 'agent_memory' THEN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO graph_changes (kind, source_id) SELECT 'node_add', id FROM new_rows;
+            ELSE
+                INSERT INTO graph_changes (kind, source_id) SELECT 'node_remove', id FROM old_rows;
+            END IF;
+        ELSIF TG_OP = 'INSERT' THEN
+            INSERT INTO graph_changes (kind, source_id, target_id) SELECT 'edge_add', source_id, target_id FROM new_rows;
+        ELSE
+            INSERT INTO graph_changes (kind, source_id, target_id) SELECT 'edge_remove', source_id, target_id FROM old_rows;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+def _changes_trigger_ddl(table):
+    return {
+        f"{table}_graph_insert": f"""CREATE TRIGGER {table}_graph_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE graph_changes_log();""",
+        f"{table}_graph_delete": f"""CREATE TRIGGER {table}_graph_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE graph_changes_log();""",
+        f"{table}_graph_truncate": f"""CREATE TRIGGER {table}_graph_truncate AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE PROCEDURE graph_changes_log();""",
+    }
+
+def ensure_edges_table():
+    """
+    Creates memory_edges, the cluster column and the change log; the log function and
+    triggers are installed only where missing. Prunes old log rows.
+    """
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            for cmd in EDGES_DDL:
+                cur.execute(cmd)
+            db.lock_for_install(cur, "graph_changes")
+            cur.execute("SELECT to_regprocedure('graph_changes_log()') IS NULL")
+            if cur.fetchone()[0]:
+                cur.execute(GRAPH_CHANGES_FUNCTION_DDL)
+            for table in ("agent_memory", "memory_edges"):
+                triggers = _changes_trigger_ddl(table)
+                for name in db.missing_triggers(cur, table, triggers):
+                    cur.execute(triggers[name])
+            cur.execute(
+                "DELETE FROM graph_changes WHERE created_at < now() - make_interval(hours => %s)",
+                (GRAPH_CHANGES_RETENTION_HOURS,)
+            )
+            cur.close()
+        return True
+    except Exception as e:
+        print(f"Memory Edges Table Error: {e}")
+        return False
+
+# --- FULL BUILD ---
+
+def knn_edges(ids, matrix, k=GRAPH_K, min_similarity=GRAPH_MIN_SIMILARITY, batch_size=GRAPH_BATCH_SIZE):
+    """
+    [(source_id, target_id, similarity)]: every row's top-k neighbours above min_similarity.
+    matrix rows must be L2-normalized; similarities are computed batch_size rows at a time.
+    """
+    count = len(ids)
+    if count < 2:
+        return []
+    k = min(k, count - 1)
+    ids = np.asarray(ids)
+    edges = []
+    for start in range(0, count, batch_size):
+        block = matrix[start:start + batch_size] @ matrix.T
+        rows = np.arange(block.shape[0])
+        block[rows, rows + start] = -np.inf  # kendisiyle bağ yok
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        scores = block[rows[:, None], top]
+        keep = scores >= min_similarity
+        sources = np.repeat(ids[start:start + block.shape[0]], k).reshape(-1, k)
+        edges.extend(zip(sources[keep].tolist(), ids[top[keep]].tolist(), scores[keep].tolist()))
+    return edges
+
+def _assign(matrix, centroids, batch_size):
+    return np.concatenate([
+        np.argmax(matrix[start:start + batch_size] @ centroids.T, axis=1)
+        for start in range(0, len(matrix), batch_size)
+    ])
+
+def kmeans(matrix, k, iterations=10, batch_size=GRAPH_BATCH_SIZE * 16, seed=42):
+    """Spherical k-means over L2-normalized rows; returns a cluster label per row. Deterministic for a seed."""
+    count = len(matrix)
+    k = max(1, min(k, count))
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(count, k, replace=False)].copy()
+    labels = _assign(matrix, centroids, batch_size)
+    for _ in range(iterations):
+        order = np.argsort(labels, kind="stable")
+        present, starts = np.unique(labels[order], return_index=True)
+        sums = np.add.reduceat(matrix[order], starts, axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids[present] = sums / norms  # boş kalan cluster eski merkezini korur
+        updated = _assign(matrix, centroids, batch_size)
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    return labels
+
+def _load_embeddings():
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, embedding::text FROM agent_memory WHERE embedding IS NOT NULL ORDER BY id")
+        fetched = cur.fetchall()
+        cur.close()
+    ids, vectors = [], []
+    for mem_id, embedding in fetched:
+        try:
+            vector = json.loads(embedding)
+        except ValueError:
+            continue
+        # Placeholder / yanlış boyutlu vektörler grafa girmez (backfill'in aradığı satırlar)
+        if not memory_service.is_placeholder_vector(vector):
+            ids.append(mem_id)
+            vectors.append(vector)
+    if not ids:
+        return [], None
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return ids, matrix / norms
+
+def rebuild_graph():
+    """
+    Recomputes the whole kNN graph and the clusters, replacing memory_edges and cluster_id.
+    The TRUNCATE logs a 'reset', so every client falls back to a full reload once.
+    Returns {"edges", "clusters"}.
+    """
+    ids, matrix = _load_embeddings()
+    edges = knn_edges(ids, matrix) if ids else []
+    labels = kmeans(matrix, math.ceil(len(ids) / GRAPH_CLUSTER_SIZE)) if ids else []
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("TRUNCATE memory_edges")
+        if edges:
+            execute_values(cur, "INSERT INTO memory_edges (source_id, target_id, similarity) VALUES %s", edges, page_size=1000)
+        cur.execute("UPDATE agent_memory SET cluster_id = NULL WHERE cluster_id IS NOT NULL")
+        if ids:
+            execute_values(cur, """
+                UPDATE agent_memory SET cluster_id = v.cluster_id
+                FROM (VALUES %s) AS v(id, cluster_id)
+                WHERE agent_memory.id = v.id
+            """, list(zip(ids, np.asarray(labels).tolist())), page_size=1000)
+        cur.close()
+    return {"edges": len(edges), "clusters": len(set(np.asarray(labels).tolist()))}
+
+# --- INCREMENTAL ---
+
+def _nearest(mem_id, vector, k):
+    """ANN neighbours of a stored memory: [(id, similarity)], itself excluded."""
+    if memory_service.use_local_index():
+        return [(i, score) for i, _, score in vector_index.index.search(vector, k + 1) if i != mem_id][:k]
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        memory_service.set_search_params(cur)
+        cur.execute("""
+            SELECT id, 1 - (embedding <=> %(q)s::vector)
+            FROM agent_memory
+            WHERE id <> %(id)s AND embedding IS NOT NULL
+            ORDER BY embedding <=> %(q)s::vector
+            LIMIT %(k)s
+        """, {"q": memory_service.to_vector_literal(vector), "id": mem_id, "k": k})
+        rows = [(r[0], float(r[1])) for r in cur.fetchall()]
+        cur.close()
+    return rows
+
+def add_node_edges(mem_id, vector, k=GRAPH_K, min_similarity=GRAPH_MIN_SIMILARITY):
+    """
+    Links a newly saved memory into the graph: it joins its nearest neighbour's cluster,
+    gets its own top-k edges, and adds a reverse edge on each neighbour, whose edge
+    list is then trimmed back to its top-k. Returns the number of neighbours linked.
+    """
+    try:
+        nearest = _nearest(mem_id, vector, k)
+        if not nearest:
+            return 0
+        neighbours = [(i, s) for i, s in nearest if s >= min_similarity]
+        rows = [(mem_id, i, s) for i, s in neighbours] + [(i, mem_id, s) for i, s in neighbours]
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE agent_memory SET cluster_id = (SELECT cluster_id FROM agent_memory WHERE id = %s) WHERE id = %s",
+                (nearest[0][0], mem_id)
+            )
+            if not rows:
+                cur.close()
+                return 0
+            execute_values(cur, """
+                INSERT INTO memory_edges (source_id, target_id, similarity) VALUES %s
+                ON CONFLICT (source_id, target_id) DO UPDATE SET similarity = EXCLUDED.similarity
+            """, rows)
+            cur.execute("""
+                DELETE FROM memory_edges e
+                USING (
+                    SELECT source_id, target_id,
+                           row_number() OVER (PARTITION BY source_id ORDER BY similarity DESC) AS rank
+                    FROM memory_edges
+                    WHERE source_id = ANY(%s)
+                ) ranked
+                WHERE e.source_id = ranked.source_id AND e.target_id = ranked.target_id AND ranked.rank > %s
+            """, ([i for i, _ in neighbours], k))
+            cur.close()
+        return len(neighbours)
+    except Exception as e:
+        print(f"Graph Edge Update Error: {e}")
+        return 0
+
+# --- READ ---
+
+_NODE_COLUMNS = "id, content, title, tags, insight, link, source, impact_score, trend_label, cluster_id"
+
+def _memory_node(row):
+    mem_id, content, title, tags, insight, link, source, impact_score, trend_label, cluster_id = row
+    title = title or (content or "")[:30]
+    return {
+        "id": str(mem_id),
+        "name": title[:30] + "..." if len(title) > 30 else title,
+        "label": title,
+        "tags": tags or [],
+        "insight": insight,
+        "link": link,
+        "source": source,
+        "impact_score": impact_score,
+        "trend_label": trend_label,
+        "cluster_id": cluster_id,
+        "full_content": content,
+        "group": "memory",
+        "val": 5 + (impact_score or 0) / 20
+    }
+
+def _cluster_node_id(cluster_id):
+    return f"cluster:{cluster_id}"
+
+def _undirected(rows):
+    """[(a, b, similarity)] with a < b; a pair stored in both directions appears once."""
+    pairs = {}
+    for source, target, similarity in rows:
+        key = (min(source, target), max(source, target))
+        pairs[key] = max(similarity, pairs.get(key, similarity))
+    return [(a, b, s) for (a, b), s in sorted(pairs.items())]
+
+def _link(source, target, similarity):
+    return {"source": str(source), "target": str(target), "value": round(similarity, 3)}
+
+def _current_version(cur):
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM graph_changes")
+    return cur.fetchone()[0]
+
+def _with_core(nodes, links):
+    # Merkez Node: ilk 5 node'a bağlı
+    for n in nodes[:5]:
+        links.append({"source": n["id"], "target": "CORE"})
+    nodes.append({"id": "CORE", "name": "NOMAD CORE", "label": "NOMAD CORE", "tags": [], "group": "core", "val": 15})
+
+def _detail_view(cur, limit, tag):
+    query = f"SELECT {_NODE_COLUMNS} FROM agent_memory"
+    params = []
+    if tag:
+        query += " WHERE tags @> ARRAY[%s]::text[]"
+        params.append(tag.upper())
+    query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+    params.append(limit)
+    cur.execute(query, params)
+    nodes = [_memory_node(r) for r in cur.fetchall()]
+    ids = [int(n["id"]) for n in nodes]
+    cur.execute("""
+        SELECT source_id, target_id, similarity FROM memory_edges
+        WHERE source_id = ANY(%(ids)s) AND target_id = ANY(%(ids)s)
+    """, {"ids": ids})
+    links = [_link(a, b, s) for a, b, s in _undirected(cur.fetchall())]
+    return nodes, links
+
+def _cluster_view(cur):
+    cur.execute("""
+        SELECT cluster_id, COUNT(*), mode() WITHIN GROUP (ORDER BY tags[1]), MAX(impact_score)
+        FROM agent_memory WHERE cluster_id IS NOT NULL
+        GROUP BY cluster_id ORDER BY COUNT(*) DESC
+    """)
+    nodes = []
+    for cluster_id, size, tag, impact_score in cur.fetchall():
+        label = f"{tag or 'CLUSTER'} ({size})"
+        nodes.append({
+            "id": _cluster_node_id(cluster_id),
+            "name": label,
+            "label": label,
+            "tags": [tag] if tag else [],
+            "cluster_id": cluster_id,
+            "size": size,
+            "impact_score": impact_score,
+            "group": "cluster",
+            "val": 5 + 2 * math.sqrt(size)
+        })
+    # Cluster'lar arası bağ ağırlığı = aradaki kNN bağı sayısı
+    cur.execute("""
+        SELECT LEAST(a.cluster_id, b.cluster_id), GREATEST(a.cluster_id, b.cluster_id), COUNT(*)
+        FROM memory_edges e
+        JOIN agent_memory a ON a.id = e.source_id
+        JOIN agent_memory b ON b.id = e.target_id
+        WHERE a.cluster_id <> b.cluster_id
+        GROUP BY 1, 2
+    """)
+    links = [
+        {"source": _cluster_node_id(a), "target": _cluster_node_id(b), "value": count}
+        for a, b, count in cur.fetchall()
+    ]
+    return nodes, links
+
+def graph_view(limit=50, tag=None, lod="auto"):
+    """
+    Full graph payload {"version", "lod", "nodes", "links"}.
+    lod="detail": newest `limit` memories and the kNN edges among them.
+    lod="cluster": one super-node per cluster; expand one with cluster_view().
+    lod="auto": cluster level once the memory outgrows GRAPH_LOD_THRESHOLD (never with a tag filter).
+    """
+    limit = max(1, min(limit, GRAPH_MAX_NODES))
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        version = _current_version(cur)
+        lod = _resolve_lod(cur, lod, tag)
+        if lod == "cluster":
+            nodes, links = _cluster_view(cur)
+        else:
+            nodes, links = _detail_view(cur, limit, tag)
+        cur.close()
+    _with_core(nodes, links)
+    return {"version": version, "lod": lod, "nodes": nodes, "links": links}
+
+def _resolve_lod(cur, lod, tag):
+    """'auto' -> 'cluster' once the clustered memory outgrows GRAPH_LOD_THRESHOLD (never with a tag filter)."""
+    if lod == "cluster":
+        return "cluster"
+    if lod != "auto" or tag:
+        return "detail"
+    cur.execute("SELECT COUNT(*) FROM agent_memory WHERE cluster_id IS NOT NULL")
+    return "cluster" if cur.fetchone()[0] > GRAPH_LOD_THRESHOLD else "detail"
+
+def cluster_view(cluster_id, limit=GRAPH_MAX_NODES):
+    """
+    Members of one cluster with their edges. Edges leaving the cluster point at the
+    other cluster's super-node (strongest similarity per member and cluster).
+    """
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        version = _current_version(cur)
+        cur.execute(
+            f"SELECT {_NODE_COLUMNS} FROM agent_memory WHERE cluster_id = %s ORDER BY created_at DESC, id DESC LIMIT %s",
+            (cluster_id, limit)
+        )
+        nodes = [_memory_node(r) for r in cur.fetchall()]
+        members = {int(n["id"]) for n in nodes}
+        cur.execute("""
+            SELECT e.source_id, e.target_id, e.similarity, b.cluster_id
+            FROM memory_edges e
+            JOIN agent_memory b ON b.id = e.target_id
+            WHERE e.source_id = ANY(%s)
+        """, (list(members),))
+        rows = cur.fetchall()
+        cur.close()
+    internal = [(a, b, s) for a, b, s, _ in rows if b in members]
+    external = {}
+    for a, _, s, other in rows:
+        if other is not None and other != cluster_id:
+            key = (a, other)
+            external[key] = max(s, external.get(key, s))
+    links = [_link(a, b, s) for a, b, s in _undirected(internal)]
+    links += [_link(a, _cluster_node_id(other), s) for (a, other), s in sorted(external.items())]
+    return {"version": version, "cluster_id": cluster_id, "nodes": nodes, "links": links}
+
+def _empty_delta(version, lod):
+    return {"version": version, "delta": True, "lod": lod, "nodes_added": [], "nodes_removed": [],
+            "links_added": [], "links_removed": []}
+
+def graph_delta(since, tag=None, lod="auto"):
+    """
+    Net changes after version `since` for a client on the given level of detail:
+    {"version", "delta": True, "lod", "nodes_added", "nodes_removed", "links_added", "links_removed"}.
+    Every entry is checked against the current tables, so an add that was later undone is not sent;
+    with a tag filter only nodes carrying the tag, and links between such nodes, are sent.
+    Returns None when the client has to reload the full graph (log pruned or reset since then,
+    more than GRAPH_MAX_DELTA changes, or any change under the cluster view, whose super-nodes
+    are aggregates and have no per-change delta).
+    """
+    wanted_tag = tag.upper() if tag else None
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        version = _current_version(cur)
+        lod = _resolve_lod(cur, lod, tag)
+        cur.execute("SELECT MIN(version) FROM graph_changes")
+        oldest = cur.fetchone()[0]
+        if since > version:
+            cur.close()
+            return None
+        if lod == "cluster":
+            cur.close()
+            return _empty_delta(version, lod) if since == version else None
+        if oldest is not None and since < oldest - 1:
+            cur.close()
+            return None
+        cur.execute("""
+            SELECT kind, source_id, target_id FROM graph_changes
+            WHERE version > %s AND version <= %s
+            ORDER BY version LIMIT %s
+        """, (max(0, since - GRAPH_DELTA_OVERLAP), version, GRAPH_MAX_DELTA + 1))
+        changes = cur.fetchall()
+        if len(changes) > GRAPH_MAX_DELTA or any(kind == "reset" for kind, _, _ in changes):
+            cur.close()
+            return None
+
+        node_ids = {s for kind, s, _ in changes if kind.startswith("node_")}
+        pairs = {(min(s, t), max(s, t)) for kind, s, t in changes if kind.startswith("edge_")}
+
+        cur.execute(f"SELECT {_NODE_COLUMNS} FROM agent_memory WHERE id = ANY(%s)", (list(node_ids),))
+        existing = {r[0]: r for r in cur.fetchall()}
+        cur.execute("""
+            SELECT e.source_id, e.target_id, e.similarity
+            FROM memory_edges e
+            JOIN unnest(%s::int[], %s::int[]) AS p(a, b)
+              ON (e.source_id = p.a AND e.target_id = p.b) OR (e.source_id = p.b AND e.target_id = p.a)
+        """, ([a for a, _ in pairs], [b for _, b in pairs]))
+        present = _undirected(cur.fetchall())
+        if wanted_tag and present:
+            # Bağın iki ucu da istemcinin filtreli grafında olmalı (yeni eklenen ya da zaten olan)
+            cur.execute(
+                "SELECT id FROM agent_memory WHERE id = ANY(%s) AND tags @> ARRAY[%s]::text[]",
+                (list({i for a, b, _ in present for i in (a, b)}), wanted_tag)
+            )
+            tagged = {r[0] for r in cur.fetchall()}
+            present_pairs = {(a, b) for a, b, _ in present}
+            present = [(a, b, s) for a, b, s in present if a in tagged and b in tagged]
+        else:
+            present_pairs = {(a, b) for a, b, _ in present}
+        cur.close()
+
+    nodes_added = [
+        _memory_node(r) for mem_id, r in sorted(existing.items())
+        if not wanted_tag or wanted_tag in (r[3] or [])
+    ]
+    return {
+        "version": version,
+        "delta": True,
+        "lod": lod,
+        "nodes_added": nodes_added,
+        "nodes_removed": sorted(str(i) for i in node_ids - existing.keys()),
+        "links_added": [_link(a, b, s) for a, b, s in present],
+        "links_removed": [{"source": str(a), "target": str(b)} for a, b in sorted(pairs - present_pairs)],
+    }
+
+if __name__ == "__main__":
+    try:
+        ensure_edges_table()
+        report = rebuild_graph()
+        print(f"✅ Graph rebuilt: {report['edges']} kNN edges, {report['clusters']} clusters.")
+    finally:
+        db.close_pool()
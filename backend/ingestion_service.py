@@ -0,0 +1,253 @@
+import os
+import asyncio
+import datetime
+from psycopg2.extras import execute_values
+import db
+import rss_service
+import og_cache_service
+import cache_service
+import trend_service
+import stats_service
+import enrichment_service
+
+# --- CONFIG ---
+# Feed'leri ne sıklıkla tarayacağımız (saniye). Cloud Run'da env ile ayarlanır.
+INGEST_INTERVAL_SECONDS = int(os.getenv("INGEST_INTERVAL_SECONDS", "300"))
+INGEST_ENABLED = os.getenv("INGEST_ENABLED", "true").lower() != "false"
+# Birden çok instance çalışırken aynı anda yalnızca biri tarar (Postgres advisory lock adı)
+INGEST_LOCK_NAME = "nomad_ingestion_cycle"
+
+ARTICLES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS articles (
+        id SERIAL PRIMARY KEY,
+        feed_id INTEGER,
+        guid TEXT,
+        link TEXT UNIQUE NOT NULL,
+        source TEXT,
+        category TEXT,
+        title TEXT,
+        summary TEXT,
+        image_url TEXT,
+        published TEXT,
+        fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_articles_category_fetched ON articles(category, fetched_at DESC);",
+    "CREATE INDEX IF NOT EXISTS idx_articles_fetched ON articles(fetched_at DESC);",
+    # Arka plan analizi (enrichment_service): ai_analyst çıktısı + filtrelenebilir kolonlar
+    "ALTER TABLE articles ADD COLUMN IF NOT EXISTS analysis JSONB;",
+    "ALTER TABLE articles ADD COLUMN IF NOT EXISTS impact_score INTEGER;",
+    "ALTER TABLE articles ADD COLUMN IF NOT EXISTS tags TEXT[] NOT NULL DEFAULT '{}';",
+    "ALTER TABLE articles ADD COLUMN IF NOT EXISTS trend_label TEXT;",
+    "ALTER TABLE articles ADD COLUMN IF NOT EXISTS analyzed_at TIMESTAMP;",
+    "ALTER TABLE articles ADD COLUMN IF NOT EXISTS enrich_claimed_at TIMESTAMP;",
+    # Her sahiplenmede artar; ENRICH_MAX_ATTEMPTS'ta bitmeyen haber enrich_failed_at ile kalıcı olarak bırakılır
+    "ALTER TABLE articles ADD COLUMN IF NOT EXISTS enrich_attempts INTEGER NOT NULL DEFAULT 0;",
+    "ALTER TABLE articles ADD COLUMN IF NOT EXISTS enrich_failed_at TIMESTAMP;",
+    "CREATE INDEX IF NOT EXISTS idx_articles_impact ON articles(impact_score DESC NULLS LAST, fetched_at DESC);",
+    "CREATE INDEX IF NOT EXISTS idx_articles_tags ON articles USING GIN (tags);",
+    "DROP INDEX IF EXISTS idx_articles_unanalyzed;",
+    "CREATE INDEX IF NOT EXISTS idx_articles_enrich_pending ON articles(fetched_at DESC) WHERE analyzed_at IS NULL AND enrich_failed_at IS NULL;",
+]
+
+_worker_task = None
+last_cycle = {"started_at": None, "finished_at": None, "articles": 0, "error": None}
+
+# --- STORAGE ---
+
+def ensure_articles_table():
+    """Creates the articles table and its indexes if they don't exist."""
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            for cmd in ARTICLES_DDL:
+                cur.execute(cmd)
+            cur.close()
+        return True
+    except Exception as e:
+        print(f"Articles Table Error: {e}")
+        return False
+
+def store_articles(articles):
+    """
+    Upserts parsed articles in a single statement.
+    Articles seen for the first time are also counted into the trend buckets
+    (same transaction), so re-fetching a feed never inflates a trend.
+    Returns the number of rows written, None when the write failed.
+    """
+    if not articles:
+        return 0
+
+    now = datetime.datetime.now()
+    rows = [
+        (
+            a.get("feed_id"),
+            str(a.get("id") or a["link"]),
+            a["link"],
+            a.get("source"),
+            a.get("category"),
+            a.get("title"),
+            a.get("summary"),
+            a.get("image_url"),
+            a.get("time"),
+            now,
+        )
+        for a in articles
+    ]
+
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            returned = execute_values(cur, """
+                INSERT INTO articles (feed_id, guid, link, source, category, title, summary, image_url, published, fetched_at)
+                VALUES %s
+                ON CONFLICT (link) DO UPDATE SET
+                    title = EXCLUDED.title,
+                    summary = EXCLUDED.summary,
+                    image_url = COALESCE(EXCLUDED.image_url, articles.image_url),
+                    category = EXCLUDED.category,
+                    source = EXCLUDED.source
+                RETURNING link, (xmax = 0) AS inserted
+            """, rows, fetch=True)
+            written = len(returned)
+            inserted = {link for link, is_new in returned if is_new}
+            if inserted:
+                new_articles = {a["link"]: dict(a, fetched_at=now) for a in articles if a["link"] in inserted}
+                trend_service.record_articles(cur, new_articles.values(), now)
+            cur.close()
+        return written
+    except Exception as e:
+        print(f"Article Store Error: {e}")
+        return None
+
+def get_articles(category="ALL", limit=50, offset=0, sort="recent", min_impact=None, tag=None):
+    """
+    Cheap indexed read for /feeds.
+    Returns articles in the same shape the live fetcher produces, plus the
+    precomputed analysis columns. sort="impact" orders by impact_score;
+    min_impact / tag filter on them (not-yet-analyzed articles have no score or tags).
+    """
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            query = """
+                SELECT guid, source, category, title, link, image_url, published, summary,
+                       impact_score, tags, trend_label
+                FROM articles
+            """
+            conditions = []
+            params = []
+            if category != "ALL":
+                conditions.append("category = %s")
+                params.append(category)
+            if min_impact is not None:
+                conditions.append("impact_score >= %s")
+                params.append(min_impact)
+            if tag:
+                conditions.append("tags @> ARRAY[%s]::text[]")
+                params.append(tag.upper())
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            if sort == "impact":
+                query += " ORDER BY impact_score DESC NULLS LAST, fetched_at DESC, id DESC"
+            else:
+                query += " ORDER BY fetched_at DESC, id DESC"
+            query += " LIMIT %s OFFSET %s"
+            params.extend([limit, offset])
+
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            cur.close()
+            return [
+                {
+                    "id": r[0],
+                    "source": r[1],
+                    "category": r[2],
+                    "title": r[3],
+                    "link": r[4],
+                    "image_url": r[5],
+                    "time": r[6] or "Recent",
+                    "summary": r[7],
+                    "impact_score": r[8],
+                    "tags": r[9] or [],
+                    "trend_label": r[10],
+                    "isLive": True
+                }
+                for r in rows
+            ]
+    except Exception as e:
+        print(f"Article Read Error: {e}")
+        return cache_service.uncached([])
+
+# --- WORKER ---
+
+async def run_ingestion_cycle():
+    """
+    Fetches every active feed once and persists the parsed articles.
+    The cycle runs under a session advisory lock; if another instance is mid-cycle
+    this one skips its turn instead of fetching and writing the same feeds.
+    """
+    lock_conn = await db.run_sync(db.try_session_lock, INGEST_LOCK_NAME)
+    if lock_conn is None:
+        print("📥 Ingestion cycle skipped: another instance is ingesting.")
+        return
+    last_cycle["started_at"] = datetime.datetime.now().isoformat()
+    try:
+        outcomes = []
+        articles = await rss_service.fetch_feeds_async("ALL", outcomes=outcomes)
+        written = await db.run_sync(store_articles, articles)
+        # Yeni ETag/Last-Modified ancak makaleler yazıldıysa kaydedilir (yoksa sonraki tur 304 alırdı)
+        await db.run_sync(rss_service.flush_feed_stats, outcomes, written is not None)
+        written = written or 0
+        last_cycle["articles"] = written
+        if written:
+            # Dashboard'un baskın terimi burada, yazma tarafında hesaplanır
+            trends = cache_service.unwrap(await db.run_sync(trend_service.get_trends))
+            if trends:
+                await db.run_sync(stats_service.set_top_trend, trends[0]["topic"])
+            await cache_service.invalidate("feeds", "trends", "stats")
+            enrichment_service.wake()
+        last_cycle["error"] = None
+        print(f"📥 Ingestion cycle done: {len(articles)} parsed, {written} stored.")
+    except Exception as e:
+        last_cycle["error"] = str(e)
+        print(f"Ingestion Error: {e}")
+    finally:
+        last_cycle["finished_at"] = datetime.datetime.now().isoformat()
+        await db.run_sync(db.release_session_lock, lock_conn, INGEST_LOCK_NAME)
+
+async def ingestion_loop(interval=INGEST_INTERVAL_SECONDS):
+    """
+    Polls feeds on its own cadence, on the API's event loop.
+    Network I/O is async; DB work and parsing are offloaded to worker threads.
+    """
+    await db.run_sync(ensure_articles_table)
+    await db.run_sync(og_cache_service.ensure_og_cache_table)
+    await db.run_sync(trend_service.ensure_trend_table)
+    while True:
+        try:
+            await run_ingestion_cycle()
+        except Exception as e:
+            # Kilit alınamadıysa (ör. DB erişilemiyor) döngü ölmesin, sonraki turda denenir
+            print(f"Ingestion Lock Error: {e}")
+        await asyncio.sleep(interval)
+
+def start():
+    """Starts the background ingestion worker (idempotent)."""
+    global _worker_task
+    if not INGEST_ENABLED:
+        print("Ingestion worker disabled (INGEST_ENABLED=false).")
+        return
+    if _worker_task is None or _worker_task.done():
+        _worker_task = asyncio.get_running_loop().create_task(ingestion_loop())
+
+async def stop():
+    global _worker_task
+    if _worker_task:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
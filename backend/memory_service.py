@@ -0,0 +1,444 @@
+import os
+import re
+import math
+import json
+import time
+from urllib.parse import urlparse
+from psycopg2.extras import execute_values
+import db
+
+# --- CONFIG ---
+# text-embedding-004 = 768 boyut
+EMBEDDING_DIM = 768
+# 'hnsw' (varsayılan, yeniden eğitim gerektirmez) veya 'ivfflat'
+MEMORY_INDEX_TYPE = os.getenv("MEMORY_INDEX_TYPE", "hnsw").lower()
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+# Sorgu anında taranan aday sayısı: yüksek = daha isabetli, düşük = daha hızlı
+MEMORY_EF_SEARCH = int(os.getenv("MEMORY_EF_SEARCH", "40"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+# IVFFlat merkezleri mevcut veriden öğrenilir: bundan az vektör varken index kurulmaz
+# (küçük tabloda tam tarama zaten hızlı); sonraki /admin/init-db veya migration kurar
+IVFFLAT_MIN_ROWS = int(os.getenv("IVFFLAT_MIN_ROWS", "1000"))
+# auto: pgvector varsa veritabanında, yoksa süreç içi NumPy index'inde (vector_index.py) arar
+MEMORY_SEARCH_BACKEND = os.getenv("MEMORY_SEARCH_BACKEND", "auto").lower()
+
+_vector_column = None
+
+MEMORY_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS vector;",
+    f"""
+    CREATE TABLE IF NOT EXISTS agent_memory (
+        id SERIAL PRIMARY KEY,
+        content TEXT,
+        embedding vector({EMBEDDING_DIM}),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+]
+
+# pgvector kurulamayan veritabanları (ör. yerel Postgres) için: embedding metin olarak saklanır
+MEMORY_TEXT_DDL = """
+    CREATE TABLE IF NOT EXISTS agent_memory (
+        id SERIAL PRIMARY KEY,
+        content TEXT,
+        embedding TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+# Anahtar kelime araması (hibrit retrieval): CVE numaraları, ürün adları vb. için.
+# 'simple' sözlüğü kök bulmaz, dil ayırmaz; Türkçe/İngilizce karışık içerikte güvenli.
+MEMORY_TEXT_SEARCH_DDL = [
+    """
+    ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED;
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_agent_memory_content_tsv ON agent_memory USING GIN (content_tsv);",
+]
+
+# Yapılandırılmış hafıza alanları: içerik metnini her istekte '|' ile parçalamak yerine
+MEMORY_FIELDS_DDL = [
+    "ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS title TEXT;",
+    "ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS tags TEXT[] NOT NULL DEFAULT '{}';",
+    "ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS insight TEXT;",
+    "ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS link TEXT;",
+    "ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS source TEXT;",
+    "ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS impact_score INTEGER;",
+    "ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS trend_label TEXT;",
+    "CREATE INDEX IF NOT EXISTS idx_agent_memory_tags ON agent_memory USING GIN (tags);",
+    "CREATE INDEX IF NOT EXISTS idx_agent_memory_created ON agent_memory(created_at DESC);",
+]
+
+MEMORY_FIELDS = ("title", "tags", "insight", "link", "source", "impact_score", "trend_label")
+
+def to_vector_literal(vector):
+    """
+    Compact pgvector input ('[0.1,0.2,...]') for a list or array of floats.
+    Bind it as %s::vector so Postgres parses it straight into the native type.
+    """
+    return "[" + ",".join(repr(float(x)) for x in vector) + "]"
+
+def _embedding_column_type(cur):
+    cur.execute("""
+        SELECT format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        WHERE a.attrelid = 'agent_memory'::regclass AND a.attname = 'embedding' AND NOT a.attisdropped
+    """)
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def has_vector_column():
+    """
+    True when agent_memory.embedding is a native pgvector column (checked once per process).
+    A failed check raises instead of being remembered as "no pgvector".
+    """
+    global _vector_column
+    if _vector_column is None:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT to_regclass('agent_memory') IS NOT NULL")
+            exists = cur.fetchone()[0]
+            column_type = _embedding_column_type(cur) if exists else None
+            cur.close()
+        _vector_column = bool(column_type and column_type.startswith("vector"))
+    return _vector_column
+
+def use_local_index():
+    """Whether search_memory should go through the in-process vector index."""
+    if MEMORY_SEARCH_BACKEND == "local":
+        return True
+    if MEMORY_SEARCH_BACKEND == "pgvector":
+        return False
+    return not has_vector_column()
+
+def cached_use_local_index():
+    """use_local_index() without I/O (safe on the event loop); None while the column type is unknown."""
+    if MEMORY_SEARCH_BACKEND in ("local", "pgvector") or _vector_column is not None:
+        return use_local_index()
+    return None
+
+def resolve_search_backend(attempts=3, delay=1.0):
+    """
+    Checks the embedding column type once at startup so request handlers can use
+    cached_use_local_index(). Transient errors are retried; if every attempt fails
+    the type stays unknown and is checked again on first use.
+    Returns use_local_index(), or None when unresolved.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return use_local_index()
+        except Exception as e:
+            print(f"Memory Schema Check Error (attempt {attempt}/{attempts}): {e}")
+            if attempt < attempts:
+                time.sleep(delay * attempt)
+    return None
+
+def _ivfflat_lists(rows):
+    """pgvector guidance: rows/1000 lists up to 1M rows, sqrt(rows) above."""
+    return max(1, rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows)))
+
+def _index_ddl(cur, report):
+    """CREATE INDEX for the configured ANN index; None if an IVFFlat index exists or must wait for data."""
+    if MEMORY_INDEX_TYPE == "ivfflat":
+        cur.execute("SELECT to_regclass('idx_agent_memory_embedding_ivfflat') IS NOT NULL")
+        if cur.fetchone()[0]:
+            return None
+        cur.execute("SELECT COUNT(*) FROM agent_memory WHERE embedding IS NOT NULL")
+        rows = cur.fetchone()[0]
+        if rows < IVFFLAT_MIN_ROWS:
+            report["index"] = "ivfflat (deferred)"
+            print(f"IVFFlat index deferred: {rows} embedded rows (< IVFFLAT_MIN_ROWS={IVFFLAT_MIN_ROWS}).")
+            return None
+        return f"""
+            CREATE INDEX IF NOT EXISTS idx_agent_memory_embedding_ivfflat
+            ON agent_memory USING ivfflat (embedding vector_cosine_ops) WITH (lists = {_ivfflat_lists(rows)});
+        """
+    return f"""
+        CREATE INDEX IF NOT EXISTS idx_agent_memory_embedding_hnsw
+        ON agent_memory USING hnsw (embedding vector_cosine_ops)
+        WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION});
+    """
+
+def ensure_memory_table():
+    """
+    Creates agent_memory with a native vector column, converts a legacy TEXT column in place
+    and builds the cosine ANN index. Safe to run repeatedly.
+    Returns a small report dict.
+    """
+    global _vector_column
+    report = {"converted": False, "nulled_rows": 0, "index": MEMORY_INDEX_TYPE}
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(MEMORY_DDL[0])
+            cur.close()
+    except Exception as e:
+        # Eklenti yok: metin kolonuyla devam, arama süreç içi index'ten yapılır
+        print(f"pgvector unavailable, using TEXT embeddings: {e}")
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(MEMORY_TEXT_DDL)
+            for cmd in MEMORY_FIELDS_DDL + MEMORY_TEXT_SEARCH_DDL:
+                cur.execute(cmd)
+            cur.close()
+        _vector_column = False
+        report["index"] = "local"
+        return report
+
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        for cmd in MEMORY_DDL[1:]:
+            cur.execute(cmd)
+
+        column_type = _embedding_column_type(cur)
+        if column_type != f"vector({EMBEDDING_DIM})":
+            # Eski TEXT kayıtlar Python list repr'i ('[0.1, 0.2, ...]'), pgvector bunu doğrudan okur.
+            # Boyutu tutmayan (placeholder) vektörler NULL'a çekilir, backfill ile yeniden üretilir.
+            cur.execute(f"""
+                SELECT COUNT(*) FROM agent_memory
+                WHERE embedding IS NOT NULL
+                  AND coalesce(array_length(string_to_array(btrim(embedding::text, '[] '), ','), 1), 0) <> {EMBEDDING_DIM}
+            """)
+            report["nulled_rows"] = cur.fetchone()[0]
+            cur.execute(f"""
+                ALTER TABLE agent_memory ALTER COLUMN embedding TYPE vector({EMBEDDING_DIM})
+                USING CASE
+                    WHEN coalesce(array_length(string_to_array(btrim(embedding::text, '[] '), ','), 1), 0) = {EMBEDDING_DIM}
+                    THEN embedding::text::vector({EMBEDDING_DIM})
+                    ELSE NULL
+                END
+            """)
+            report["converted"] = True
+
+        index_ddl = _index_ddl(cur, report)
+        if index_ddl:
+            cur.execute(index_ddl)
+        for cmd in MEMORY_FIELDS_DDL + MEMORY_TEXT_SEARCH_DDL:
+            cur.execute(cmd)
+        cur.execute("ANALYZE agent_memory;")
+        cur.close()
+    _vector_column = True
+    return report
+
+def set_search_params(cur):
+    """Per-transaction ANN recall/speed knobs; call before a nearest-neighbour query."""
+    if MEMORY_INDEX_TYPE == "ivfflat":
+        cur.execute("SET LOCAL ivfflat.probes = %s", (IVFFLAT_PROBES,))
+    else:
+        cur.execute("SET LOCAL hnsw.ef_search = %s", (MEMORY_EF_SEARCH,))
+
+def parse_memory_content(text):
+    """
+    Legacy content string -> fields:
+    "Title | Tags: AI, TECH | Insight: ... | Link: https://..."
+    Unknown segments are ignored; a string without '|' is treated as a bare title.
+    """
+    fields = {"title": None, "tags": [], "insight": None, "link": None}
+    parts = [p.strip() for p in (text or "").split("|")]
+    if parts and parts[0]:
+        fields["title"] = parts[0]
+    for part in parts[1:]:
+        match = re.match(r"(Tags|Insight|Link)\s*:\s*(.*)", part, re.IGNORECASE | re.DOTALL)
+        if not match:
+            continue
+        key, value = match.group(1).lower(), match.group(2).strip()
+        if key == "tags":
+            fields["tags"] = [t.strip() for t in value.split(",") if t.strip()]
+        elif value:
+            fields[key] = value
+    return fields
+
+def coerce_tags(tags):
+    """Raw tag value -> list of strings (model output may be a list, "AI, TECH" or null)."""
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    if not isinstance(tags, (list, tuple, set)):
+        return []
+    return [str(t) for t in tags if t is not None]
+
+def coerce_score(score):
+    """Raw impact score -> int in 0-100 or None ("85/100", "85.5" and 85.5 are all 85)."""
+    if score is None or isinstance(score, bool):
+        return None
+    if not isinstance(score, (int, float)):
+        match = re.search(r"-?\d+(?:\.\d+)?", str(score))
+        if not match:
+            return None
+        score = float(match.group())
+    try:
+        return max(0, min(100, int(score)))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+def memory_fields(text, meta=None):
+    """
+    Structured columns for a memory row: explicit values from meta (e.g. ai_analyst output)
+    win, anything missing is parsed from the content string.
+    """
+    fields = parse_memory_content(text)
+    for key, value in (meta or {}).items():
+        if key in MEMORY_FIELDS and value not in (None, "", []):
+            fields[key] = value
+    fields["tags"] = list(dict.fromkeys(t.strip().upper() for t in coerce_tags(fields.get("tags")) if t.strip()))
+    if not fields.get("source") and fields.get("link"):
+        host = urlparse(fields["link"]).netloc.lower()
+        fields["source"] = host[4:] if host.startswith("www.") else (host or None)
+    fields["impact_score"] = coerce_score(fields.get("impact_score"))
+    return {key: fields.get(key) for key in MEMORY_FIELDS}
+
+def ensure_memory_fields():
+    """
+    Adds the structured and full-text (content_tsv) columns/indexes to an existing
+    agent_memory; idempotent, only the first run after an upgrade does any work.
+    """
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT to_regclass('agent_memory') IS NOT NULL")
+            if cur.fetchone()[0]:
+                for cmd in MEMORY_FIELDS_DDL + MEMORY_TEXT_SEARCH_DDL:
+                    cur.execute(cmd)
+            cur.close()
+        return True
+    except Exception as e:
+        print(f"Memory Fields Error: {e}")
+        return False
+
+_INSERT_COLUMNS = "content, embedding, " + ", ".join(MEMORY_FIELDS)
+
+def _insert_row(text, vector, meta):
+    fields = memory_fields(text, meta)
+    return (text, to_vector_literal(vector)) + tuple(fields[key] for key in MEMORY_FIELDS)
+
+def save_memory(text, vector, meta=None):
+    """
+    Inserts one memory row (native vector when pgvector is there, text otherwise) and returns its id.
+    meta: optional structured fields (title, tags, insight, link, source, impact_score, trend_label).
+    """
+    cast = "::vector" if has_vector_column() else ""
+    placeholders = ", ".join(["%s"] * len(MEMORY_FIELDS))
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"INSERT INTO agent_memory ({_INSERT_COLUMNS}) VALUES (%s, %s{cast}, {placeholders}) RETURNING id;",
+            _insert_row(text, vector, meta)
+        )
+        memory_id = cur.fetchone()[0]
+        cur.close()
+    return memory_id
+
+def save_memories(items, metas=None):
+    """
+    Bulk insert: items is [(text, vector)], metas an optional parallel list of field dicts.
+    Returns the new ids in input order.
+    """
+    if not items:
+        return []
+    metas = metas or [None] * len(items)
+    cast = "::vector" if has_vector_column() else ""
+    placeholders = ", ".join(["%s"] * len(MEMORY_FIELDS))
+    rows = [_insert_row(text, vector, meta) for (text, vector), meta in zip(items, metas)]
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        ids = execute_values(
+            cur,
+            f"INSERT INTO agent_memory ({_INSERT_COLUMNS}) VALUES %s RETURNING id;",
+            rows, template=f"(%s, %s{cast}, {placeholders})", page_size=len(rows), fetch=True
+        )
+        cur.close()
+    return [r[0] for r in ids]
+
+def backfill_memory_fields(page_size=500):
+    """
+    Parses structured fields out of legacy rows (title IS NULL), one UPDATE per page.
+    Returns the number of rows updated.
+    """
+    updated = 0
+    after_id = 0
+    while True:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT id, content FROM agent_memory
+                WHERE title IS NULL AND id > %s ORDER BY id LIMIT %s
+            """, (after_id, page_size))
+            rows = cur.fetchall()
+            if not rows:
+                cur.close()
+                break
+            after_id = rows[-1][0]
+            values = []
+            for mem_id, content in rows:
+                f = memory_fields(content)
+                values.append((mem_id, f["title"], f["tags"], f["insight"], f["link"], f["source"]))
+            execute_values(cur, """
+                UPDATE agent_memory AS m SET
+                    title = v.title, tags = v.tags, insight = v.insight, link = v.link, source = v.source
+                FROM (VALUES %s) AS v(id, title, tags, insight, link, source)
+                WHERE m.id = v.id
+            """, values, template="(%s, %s, %s::text[], %s, %s, %s)", page_size=len(values))
+            updated += cur.rowcount
+            cur.close()
+    return updated
+
+def is_placeholder(embedding_text):
+    """
+    True for rows that never got a real embedding: NULL, wrong dimension
+    or a constant filler vector like [0.1]*768.
+    """
+    if embedding_text is None:
+        return True
+    try:
+        values = json.loads(embedding_text)
+    except ValueError:
+        return True
+    return is_placeholder_vector(values)
+
+def is_placeholder_vector(values):
+    """is_placeholder for an already parsed vector."""
+    return len(values) != EMBEDDING_DIM or len(set(values)) == 1
+
+def find_placeholder_rows(after_id=0, limit=500):
+    """Keyset-paginated scan: [(id, content)] of rows needing a real embedding, plus the last id scanned."""
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, content, embedding::text FROM agent_memory
+            WHERE id > %s ORDER BY id LIMIT %s
+        """, (after_id, limit))
+        rows = cur.fetchall()
+        cur.close()
+    last_id = rows[-1][0] if rows else None
+    return [(r[0], r[1]) for r in rows if r[1] and is_placeholder(r[2])], last_id
+
+def update_embeddings(rows):
+    """rows: [(id, vector)]. One UPDATE ... FROM (VALUES ...) for the whole batch."""
+    if not rows:
+        return 0
+    cast = "::vector" if has_vector_column() else ""
+    values = [(mem_id, to_vector_literal(vector)) for mem_id, vector in rows]
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        execute_values(cur, f"""
+            UPDATE agent_memory AS m SET embedding = v.embedding{cast}
+            FROM (VALUES %s) AS v(id, embedding)
+            WHERE m.id = v.id
+        """, values, template="(%s, %s)", page_size=len(values))
+        updated = cur.rowcount
+        cur.close()
+    return updated
+
+if __name__ == "__main__":
+    # Migration: python memory_service.py
+    from pathlib import Path
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path=Path(__file__).parent / '.env')
+    try:
+        result = ensure_memory_table()
+        print(f"✅ agent_memory migrated: {result}")
+        print(f"✅ Structured fields backfilled: {backfill_memory_fields()} rows")
+    except Exception as e:
+        print(f"❌ Memory migration failed: {e}")
+    finally:
+        db.close_pool()
@@ -0,0 +1,45 @@
+import os
+import time
+import threading
+from collections import deque
+
+# --- CONFIG ---
+# Her metrik için tutulan son ölçüm sayısı (yüzdelikler bu pencereden hesaplanır)
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "500"))
+
+_series = {}
+_lock = threading.Lock()
+
+def record(name, value_ms):
+    """Adds one latency sample (milliseconds) to the named series."""
+    with _lock:
+        series = _series.get(name)
+        if series is None:
+            series = _series[name] = deque(maxlen=METRICS_WINDOW)
+        series.append(value_ms)
+
+def elapsed_ms(started):
+    """Milliseconds since a time.perf_counter() start."""
+    return round((time.perf_counter() - started) * 1000, 1)
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summary():
+    """{name: {count, last, p50, p95, max}} over the recent window of every series."""
+    with _lock:
+        snapshot = {name: list(series) for name, series in _series.items()}
+    result = {}
+    for name, values in snapshot.items():
+        if not values:
+            continue
+        ordered = sorted(values)
+        result[name] = {
+            "count": len(values),
+            "last": values[-1],
+            "p50": _percentile(ordered, 50),
+            "p95": _percentile(ordered, 95),
+            "max": ordered[-1],
+        }
+    return result
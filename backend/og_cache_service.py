@@ -0,0 +1,73 @@
+import os
+import datetime
+from psycopg2.extras import execute_values
+import db
+
+# --- CONFIG ---
+# og:image bulunamayan linkler bu süre boyunca tekrar taranmaz (saat).
+OG_NEGATIVE_TTL_HOURS = float(os.getenv("OG_NEGATIVE_TTL_HOURS", "24"))
+
+OG_CACHE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS og_image_cache (
+        url TEXT PRIMARY KEY,
+        image_url TEXT,
+        fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+]
+
+def ensure_og_cache_table():
+    """Creates the og_image_cache table if it doesn't exist."""
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            for cmd in OG_CACHE_DDL:
+                cur.execute(cmd)
+            cur.close()
+        return True
+    except Exception as e:
+        print(f"OG Cache Table Error: {e}")
+        return False
+
+def lookup(urls):
+    """
+    Returns {article_url: image_url} for every url we already know about.
+    Negative results (image_url None) are only returned while younger than OG_NEGATIVE_TTL_HOURS;
+    urls missing from the result need a network fetch.
+    """
+    if not urls:
+        return {}
+    negative_cutoff = datetime.datetime.now() - datetime.timedelta(hours=OG_NEGATIVE_TTL_HOURS)
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT url, image_url FROM og_image_cache
+                WHERE url = ANY(%s) AND (image_url IS NOT NULL OR fetched_at > %s)
+            """, (list(urls), negative_cutoff))
+            rows = cur.fetchall()
+            cur.close()
+        return {r[0]: r[1] for r in rows}
+    except Exception as e:
+        print(f"OG Cache Read Error: {e}")
+        return {}
+
+def store(results):
+    """Upserts {article_url: image_url or None} in one statement."""
+    if not results:
+        return
+    now = datetime.datetime.now()
+    rows = [(url, image_url, now) for url, image_url in results.items()]
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            execute_values(cur, """
+                INSERT INTO og_image_cache (url, image_url, fetched_at) VALUES %s
+                ON CONFLICT (url) DO UPDATE SET
+                    image_url = EXCLUDED.image_url,
+                    fetched_at = EXCLUDED.fetched_at
+            """, rows, page_size=len(rows))
+            cur.close()
+    except Exception as e:
+        print(f"OG Cache Write Error: {e}")
@@ -1,88 +1,205 @@
-import psycopg2
 import os
-from embedding_service import generate_embedding
+import time
+import asyncio
+import db
+import memory_service
+import vector_index
+import metrics_service
+import answer_cache_service
+from embedding_service import embed_query, embed_query_async
 import google.generativeai as genai
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Veritabanı bağlantı bilgisi - Use environment variables
-def get_db_connection():
-    import os
-    db_host = os.getenv("DB_HOST")
-    db_user = os.getenv("DB_USER", "postgres")
-    db_password = os.getenv("DB_PASSWORD")
-    db_name = os.getenv("DB_NAME", "postgres")
-    
-    if db_host and db_password:
-        return psycopg2.connect(
-            host=db_host,
-            user=db_user,
-            password=db_password,
-            database=db_name,
-            port=5432,
-            sslmode="require"
-        )
-    # Fallback
-    db_url = os.getenv("DB_URL")
-    if db_url:
-        return psycopg2.connect(db_url)
-    raise Exception("Database connection failed: DB_HOST and DB_PASSWORD required")
-
-DB_CONNECTION = None  # Will be created dynamically
-
 # Configure genai if not already configured in main (it is safer to configure here too or rely on singleton if env set)
 API_KEY = os.getenv("GEMINI_API_KEY")
 if API_KEY:
     genai.configure(api_key=API_KEY)
 
-def search_memory(query_text, limit=3):
+RAG_MODEL = 'models/gemini-2.5-flash'
+RAG_TOP_K = 3
+ERROR_PREFIX = "Düşünürken hata oluştu"
+
+# --- HYBRID RETRIEVAL ---
+# Her aşamadan (vektör / anahtar kelime) füzyona giren aday sayısı
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+# Reciprocal Rank Fusion sabiti: skor = Σ 1 / (RRF_K + sıra)
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Anahtar kelime listesinin RRF ağırlığı (vektör = 1.0): yalnızca metinle eşleşen gürültü
+# top-k'ya vektörle bulunan kayıtlardan daha zor girer
+HYBRID_TEXT_WEIGHT = float(os.getenv("HYBRID_TEXT_WEIGHT", "0.5"))
+# Aşama başına süre sınırları (ms): süresi dolan aşama boş sayılır, diğeriyle devam edilir
+RETRIEVAL_EMBED_TIMEOUT_MS = int(os.getenv("RETRIEVAL_EMBED_TIMEOUT_MS", "3000"))
+RETRIEVAL_VECTOR_TIMEOUT_MS = int(os.getenv("RETRIEVAL_VECTOR_TIMEOUT_MS", "800"))
+RETRIEVAL_TEXT_TIMEOUT_MS = int(os.getenv("RETRIEVAL_TEXT_TIMEOUT_MS", "500"))
+
+def _query_memory(query_vector, limit):
     """
-    Soru metnini alır, vektöre çevirir ve veritabanında en yakın 3 kaydı bulur.
+    Vektöre en yakın kayıtları [(id, content, similarity)] olarak döndürür (blocking DB çağrısı).
+    similarity = 1 - cosine mesafesi.
     """
-    # 1. Soruyu Vektöre Çevir
-    query_vector = generate_embedding(query_text)
-    if not query_vector:
-        return []
-
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # 2. Vektör Araması (Cosine Distance)
-        # <=> operatörü "mesafe" ölçer. En küçük mesafe, en yakın anlam demektir.
-        search_sql = """
-            SELECT content, (embedding <=> %s::vector) as distance 
-            FROM agent_memory 
-            ORDER BY distance ASC 
-            LIMIT %s;
-        """
-        
-        # Casting vector to string for SQL
-        cursor.execute(search_sql, (str(query_vector), limit))
-        results = cursor.fetchall()
-        
-        # Sadece metinleri listeye atıp döndürelim
-        matches = [row[0] for row in results]
-        
-        cursor.close()
-        conn.close()
+        if memory_service.use_local_index():
+            return _query_local_index(query_vector, limit)
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+
+            # 2. Vektör Araması (Cosine Distance)
+            # <=> operatörü "mesafe" ölçer. En küçük mesafe, en yakın anlam demektir.
+            # ORDER BY doğrudan mesafe ifadesi olmalı ki HNSW/IVFFlat index'i kullanılsın.
+            # Embedding'i henüz olmayan (NULL) satırlar sonuçlara girmez.
+            memory_service.set_search_params(cursor)
+            cursor.execute("SET LOCAL statement_timeout = %s", (RETRIEVAL_VECTOR_TIMEOUT_MS,))
+            search_sql = """
+                SELECT id, content, 1 - (embedding <=> %(q)s::vector)
+                FROM agent_memory
+                WHERE embedding IS NOT NULL
+                ORDER BY embedding <=> %(q)s::vector
+                LIMIT %(limit)s;
+            """
+            cursor.execute(search_sql, {"q": memory_service.to_vector_literal(query_vector), "limit": limit})
+            matches = [(row[0], row[1], float(row[2])) for row in cursor.fetchall()]
+            cursor.close()
         return matches
 
     except Exception as e:
         print(f"❌ Arama Hatası: {e}")
         return []
 
-def ask_nomad(user_question):
+def _query_local_index(query_vector, limit):
+    """pgvector olmadan: süreç içi NumPy index'inde kesin cosine top-k."""
+    try:
+        vector_index.index.maybe_sync()
+        return vector_index.index.search(query_vector, limit)
+    except Exception as e:
+        print(f"❌ Yerel Index Arama Hatası: {e}")
+        return []
+
+# Sorgu terimleri 'simple' ile (content_tsv gibi) çıkarılır; İngilizce/Türkçe stopword'ler
+# ("the", "ve", ...) atılır, kalan anahtar terimler {op} ile birleştirilir
+_TEXT_SEARCH_SQL = """
+    WITH q AS (
+        SELECT string_agg(quote_literal(term), ' {op} ')::tsquery AS query
+        FROM unnest(tsvector_to_array(to_tsvector('simple', %s))) AS term
+        WHERE to_tsvector('english', term) <> ''::tsvector
+          AND to_tsvector('turkish', term) <> ''::tsvector
+    )
+    SELECT m.id, m.content
+    FROM agent_memory m, q
+    WHERE q.query IS NOT NULL AND m.content_tsv @@ q.query
+    ORDER BY ts_rank_cd(m.content_tsv, q.query, 1) DESC
+    LIMIT %s;
+"""
+# Önce tüm anahtar terimler (AND); hiç eşleşme yoksa herhangi biri (OR)
+_TEXT_QUERIES = (_TEXT_SEARCH_SQL.format(op="&"), _TEXT_SEARCH_SQL.format(op="|"))
+
+def _text_search(query_text, limit):
     """
-    RAG Mekanizması:
-    1. Hafızada ara.
-    2. Bulunanları bağlam (context) olarak Gemini'ye ver.
-    3. Cevabı üret.
+    Anahtar kelime araması: [(id, content, None)] (blocking DB çağrısı).
+    Stopword'ler atıldıktan sonra önce tüm anahtar terimleri içeren kayıtlar aranır; yalnızca
+    hiç yoksa terimler OR'lanır (yalnızca "the"/"ve" eşleşmesi aday listesine girmez).
+    Sıralama ts_rank_cd ile doküman uzunluğuna göre normalize edilir.
     """
-    # 1. Hafızayı Tara
-    relevant_docs = search_memory(user_question)
-    
+    try:
+        matches = []
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SET LOCAL statement_timeout = %s", (RETRIEVAL_TEXT_TIMEOUT_MS,))
+            for sql in _TEXT_QUERIES:
+                cursor.execute(sql, (query_text, limit))
+                matches = [(row[0], row[1], None) for row in cursor.fetchall()]
+                if matches:
+                    break
+            cursor.close()
+        return matches
+    except Exception as e:
+        print(f"❌ Metin Arama Hatası: {e}")
+        return []
+
+def fuse_rankings(vector_rows, text_rows, limit):
+    """
+    Reciprocal Rank Fusion: her listedeki sırasına göre weight/(RRF_K + sıra) toplanır
+    (anahtar kelime listesi HYBRID_TEXT_WEIGHT ile ağırlıklandırılır).
+    Dönen satırlar (id, content, vektör benzerliği veya None).
+    """
+    scores = {}
+    rows = {}
+    for ranked, weight in ((vector_rows, 1.0), (text_rows, HYBRID_TEXT_WEIGHT)):
+        for rank, row in enumerate(ranked, start=1):
+            scores[row[0]] = scores.get(row[0], 0.0) + weight / (RRF_K + rank)
+            # Vektör benzerliği olan satırı tercih et (cevap cache'i bunu kullanır)
+            if row[0] not in rows or rows[row[0]][2] is None:
+                rows[row[0]] = row
+    best = sorted(scores, key=lambda mem_id: scores[mem_id], reverse=True)[:limit]
+    return [rows[mem_id] for mem_id in best]
+
+def search_memory(query_text, limit=3):
+    """
+    Soru metnini alır, vektöre çevirir ve hafızada hibrit (vektör + anahtar kelime) arama yapar.
+    """
+    # 1. Soruyu Vektöre Çevir (retrieval_query: dokümanlar retrieval_document ile kaydedildi)
+    query_vector = embed_query(query_text)
+    vector_rows = _query_memory(query_vector, HYBRID_CANDIDATES) if query_vector else []
+    text_rows = _text_search(query_text, HYBRID_CANDIDATES)
+    return [content for _, content, _ in fuse_rankings(vector_rows, text_rows, limit)]
+
+async def search_memory_async(query_text, limit=3):
+    """search_memory'nin async karşılığı: embedding async, DB sorguları thread havuzunda."""
+    _, rows = await _retrieve_async(query_text, limit)
+    return [content for _, content, _ in rows]
+
+async def _timeboxed(stage, awaitable, timeout_ms, timings, default):
+    """Bir retrieval aşamasını süre sınırıyla çalıştırır, süresini timings'e ve metriklere yazar."""
+    started = time.perf_counter()
+    try:
+        return await asyncio.wait_for(awaitable, timeout_ms / 1000)
+    except asyncio.TimeoutError:
+        timings[f"{stage}_timeout"] = True
+        print(f"⏱️ Retrieval stage '{stage}' timed out ({timeout_ms} ms)")
+        return default
+    finally:
+        timings[f"{stage}_ms"] = metrics_service.elapsed_ms(started)
+        metrics_service.record(f"retrieval.{stage}_ms", timings[f"{stage}_ms"])
+
+async def _retrieve_async(query_text, limit=RAG_TOP_K, timings=None):
+    """
+    Hibrit retrieval: (soru vektörü, [(id, content, similarity)]).
+    Anahtar kelime araması embedding beklenmeden başlar; vektör araması embedding gelince.
+    Sonuçlar RRF ile birleştirilir. Cevap cache'i için id'ler ve skorlar da döner.
+    """
+    timings = {} if timings is None else timings
+    text_task = asyncio.ensure_future(_timeboxed(
+        "text", db.run_sync(_text_search, query_text, HYBRID_CANDIDATES), RETRIEVAL_TEXT_TIMEOUT_MS, timings, []
+    ))
+
+    query_vector = await _timeboxed("embed", embed_query_async(query_text), RETRIEVAL_EMBED_TIMEOUT_MS, timings, None)
+    vector_rows = []
+    if query_vector:
+        vector_rows = await _timeboxed(
+            "vector", db.run_sync(_query_memory, query_vector, HYBRID_CANDIDATES), RETRIEVAL_VECTOR_TIMEOUT_MS, timings, []
+        )
+    text_rows = await text_task
+
+    return query_vector, fuse_rankings(vector_rows, text_rows, limit)
+
+def _cached_answer(query_vector, rows):
+    if query_vector is None:
+        return None
+    return answer_cache_service.cache.lookup(query_vector, [r[0] for r in rows])
+
+def _remember_answer(query_vector, rows, answer, limit=RAG_TOP_K):
+    if query_vector is None or not answer or answer.startswith(ERROR_PREFIX):
+        return
+    # top-k dolmadıysa ya da sadece metinle bulunan kayıt varsa her yeni kayıt sonucu değiştirebilir
+    if len(rows) >= limit and all(r[2] is not None for r in rows):
+        min_score = min(r[2] for r in rows)
+    else:
+        min_score = -1.0
+    answer_cache_service.cache.store(query_vector, [r[0] for r in rows], min_score, answer)
+
+def build_prompt(user_question, relevant_docs):
+    """Bulunan dokümanları bağlam olarak kullanan RAG prompt'u."""
     # If no relevant docs found, maybe return a default or let Gemini answer with its own knowledge but warning it?
     # User prompt said: "Eğer bilgi içinde cevap yoksa 'Bunu bilmiyorum' de".
     # So if relevant_docs is empty, context is empty.
@@ -93,8 +210,7 @@ def ask_nomad(user_question):
     else:
         context_text = "\n\n".join(relevant_docs)
     
-    # 2. Gemini'ye Talimat Ver
-    prompt = f"""
+    return f"""
     Sen Nomad adında akıllı bir asistansın.
     Aşağıdaki BİLGİLERİ kullanarak kullanıcının sorusuna cevap ver.
     Eğer bilgi içinde cevap yoksa "Bunu bilmiyorum" de, uydurma.
@@ -105,16 +221,95 @@ def ask_nomad(user_question):
     KULLANICI SORUSU:
     {user_question}
     """
+
+def ask_nomad(user_question):
+    """
+    RAG Mekanizması:
+    1. Hafızada ara.
+    2. Bulunanları bağlam (context) olarak Gemini'ye ver.
+    3. Cevabı üret.
+    """
+    # 1. Hafızayı Tara
+    relevant_docs = search_memory(user_question)
+    
+    # 2. Gemini'ye Talimat Ver
+    prompt = build_prompt(user_question, relevant_docs)
     
     try:
         # Using the model known to work: gemini-2.5-flash (from previous discovery)
         # User requested gemini-2.0-flash-exp, but we saw 404s with 1.5. 2.5 works.
         # Let's try 2.5-flash as it is reliable here.
-        model = genai.GenerativeModel('models/gemini-2.5-flash') 
+        model = genai.GenerativeModel(RAG_MODEL) 
         response = model.generate_content(prompt)
         return response.text
     except Exception as e:
-        return f"Düşünürken hata oluştu: {e}"
+        return f"{ERROR_PREFIX}: {e}"
+
+async def ask_nomad_async(user_question):
+    """
+    ask_nomad'ın async karşılığı (/ask endpoint'i için).
+    Benzer bir soru aynı dokümanlarla daha önce cevaplandıysa Gemini çağrılmaz.
+    """
+    query_vector, rows = await _retrieve_async(user_question)
+    cached = _cached_answer(query_vector, rows)
+    if cached is not None:
+        return cached
+
+    prompt = build_prompt(user_question, [content for _, content, _ in rows])
+    try:
+        model = genai.GenerativeModel(RAG_MODEL)
+        response = await model.generate_content_async(prompt)
+        answer = response.text
+    except Exception as e:
+        return f"{ERROR_PREFIX}: {e}"
+
+    _remember_answer(query_vector, rows, answer)
+    return answer
+
+async def ask_nomad_stream(user_question, timings=None):
+    """
+    /ask/stream için: önce hafıza araması, sonra Gemini cevabını parça parça üretir (async generator).
+    timings verilirse retrieval_ms, ttft_ms (ilk token) ve total_ms ile doldurulur; metrikler kaydedilir.
+    """
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+
+    query_vector, rows = await _retrieve_async(user_question, timings=timings)
+    timings["retrieval_ms"] = metrics_service.elapsed_ms(started)
+    metrics_service.record("ask.retrieval_ms", timings["retrieval_ms"])
+
+    cached = _cached_answer(query_vector, rows)
+    if cached is not None:
+        timings["cache_hit"] = True
+        timings["ttft_ms"] = timings["total_ms"] = metrics_service.elapsed_ms(started)
+        metrics_service.record("ask.cache_hit_ms", timings["total_ms"])
+        yield cached
+        return
+
+    prompt = build_prompt(user_question, [content for _, content, _ in rows])
+    parts = []
+    try:
+        model = genai.GenerativeModel(RAG_MODEL)
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Güvenlik filtresi vb. nedeniyle metinsiz parça
+                continue
+            if not text:
+                continue
+            if "ttft_ms" not in timings:
+                timings["ttft_ms"] = metrics_service.elapsed_ms(started)
+                metrics_service.record("ask.ttft_ms", timings["ttft_ms"])
+            parts.append(text)
+            yield text
+        _remember_answer(query_vector, rows, "".join(parts))
+    except Exception as e:
+        yield f"{ERROR_PREFIX}: {e}"
+    finally:
+        timings["total_ms"] = metrics_service.elapsed_ms(started)
+        metrics_service.record("ask.stream_total_ms", timings["total_ms"])
 
 # --- TEST ---
 if __name__ == "__main__":
@@ -4,5 +4,133 @@ ALTER TABLE feeds ADD COLUMN IF NOT EXISTS last_fetch_status TEXT;
 ALTER TABLE feeds ADD COLUMN IF NOT EXISTS last_fetch_time TIMESTAMP;
 ALTER TABLE feeds ADD COLUMN IF NOT EXISTS failure_count INTEGER DEFAULT 0;
 
+-- HTTP validators for conditional GET (If-None-Match / If-Modified-Since)
+ALTER TABLE feeds ADD COLUMN IF NOT EXISTS etag TEXT;
+ALTER TABLE feeds ADD COLUMN IF NOT EXISTS last_modified TEXT;
+
 -- Optional: Create index for faster active feed lookup
 CREATE INDEX IF NOT EXISTS idx_feeds_active ON feeds(is_active);
+
+-- Parsed articles written by the background ingestion worker (ingestion_service.py)
+CREATE TABLE IF NOT EXISTS articles (
+    id SERIAL PRIMARY KEY,
+    feed_id INTEGER,
+    guid TEXT,
+    link TEXT UNIQUE NOT NULL,
+    source TEXT,
+    category TEXT,
+    title TEXT,
+    summary TEXT,
+    image_url TEXT,
+    published TEXT,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_articles_category_fetched ON articles(category, fetched_at DESC);
+CREATE INDEX IF NOT EXISTS idx_articles_fetched ON articles(fetched_at DESC);
+
+-- Article URL -> og:image cache (og_cache_service.py). NULL image_url = negative result.
+CREATE TABLE IF NOT EXISTS og_image_cache (
+    url TEXT PRIMARY KEY,
+    image_url TEXT,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Long-term memory with native pgvector embeddings (memory_service.py).
+-- Legacy TEXT embeddings are converted by `python memory_service.py`.
+CREATE EXTENSION IF NOT EXISTS vector;
+CREATE TABLE IF NOT EXISTS agent_memory (
+    id SERIAL PRIMARY KEY,
+    content TEXT,
+    embedding vector(768),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_agent_memory_embedding_hnsw
+    ON agent_memory USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+-- Content-hash -> embedding cache (embedding_cache_service.py)
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    task_type TEXT,
+    embedding REAL[] NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Keyword side of hybrid retrieval (rag_service.py)
+ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED;
+CREATE INDEX IF NOT EXISTS idx_agent_memory_content_tsv ON agent_memory USING GIN (content_tsv);
+
+-- Structured memory fields (memory_service.py); legacy rows are backfilled by `python memory_service.py`
+ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS title TEXT;
+ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS tags TEXT[] NOT NULL DEFAULT '{}';
+ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS insight TEXT;
+ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS link TEXT;
+ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS source TEXT;
+ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS impact_score INTEGER;
+ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS trend_label TEXT;
+CREATE INDEX IF NOT EXISTS idx_agent_memory_tags ON agent_memory USING GIN (tags);
+CREATE INDEX IF NOT EXISTS idx_agent_memory_created ON agent_memory(created_at DESC);
+
+-- Hourly per-term article counts behind /trends (trend_service.py)
+CREATE TABLE IF NOT EXISTS trend_buckets (
+    term TEXT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (term, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_trend_buckets_bucket ON trend_buckets(bucket);
+
+-- Dashboard counters kept current by statement-level triggers (stats_service.py
+-- installs dashboard_stats_count() and the feeds/agent_memory triggers).
+CREATE TABLE IF NOT EXISTS dashboard_stats (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    total_sources BIGINT NOT NULL DEFAULT 0,
+    total_intel BIGINT NOT NULL DEFAULT 0,
+    top_trend TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Precomputed kNN edges between memories (graph_service.py)
+CREATE TABLE IF NOT EXISTS memory_edges (
+    source_id INTEGER NOT NULL REFERENCES agent_memory(id) ON DELETE CASCADE,
+    target_id INTEGER NOT NULL REFERENCES agent_memory(id) ON DELETE CASCADE,
+    similarity REAL NOT NULL,
+    PRIMARY KEY (source_id, target_id)
+);
+CREATE INDEX IF NOT EXISTS idx_memory_edges_target ON memory_edges(target_id);
+
+-- Graph clusters and change log for ?since=<version> deltas (graph_service.py
+-- installs graph_changes_log() and its triggers on agent_memory / memory_edges).
+ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS cluster_id INTEGER;
+CREATE INDEX IF NOT EXISTS idx_agent_memory_cluster ON agent_memory(cluster_id);
+CREATE TABLE IF NOT EXISTS graph_changes (
+    version BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    source_id INTEGER,
+    target_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Article analysis cache (analysis_cache_service.py)
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    prompt_version TEXT,
+    result JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Precomputed article analysis (enrichment_service.py)
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS analysis JSONB;
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS impact_score INTEGER;
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS tags TEXT[] NOT NULL DEFAULT '{}';
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS trend_label TEXT;
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS analyzed_at TIMESTAMP;
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS enrich_claimed_at TIMESTAMP;
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS enrich_attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS enrich_failed_at TIMESTAMP;
+CREATE INDEX IF NOT EXISTS idx_articles_impact ON articles(impact_score DESC NULLS LAST, fetched_at DESC);
+CREATE INDEX IF NOT EXISTS idx_articles_tags ON articles USING GIN (tags);
+DROP INDEX IF EXISTS idx_articles_unanalyzed;
+CREATE INDEX IF NOT EXISTS idx_articles_enrich_pending ON articles(fetched_at DESC) WHERE analyzed_at IS NULL AND enrich_failed_at IS NULL;
@@ -0,0 +1,133 @@
+import db
+import cache_service
+
+# Sayaçlar tetikleyicilerle tutulur: feeds/agent_memory'ye hangi yoldan yazılırsa yazılsın
+# (API, setup script'leri, toplu yükleyiciler) dashboard_stats güncel kalır.
+STATS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS dashboard_stats (
+        id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+        total_sources BIGINT NOT NULL DEFAULT 0,
+        total_intel BIGINT NOT NULL DEFAULT 0,
+        top_trend TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    "INSERT INTO dashboard_stats (id) VALUES (1) ON CONFLICT (id) DO NOTHING;",
+]
+
+STATS_FUNCTION_DDL = """
+    CREATE OR REPLACE FUNCTION dashboard_stats_count() RETURNS trigger AS $$
+    DECLARE
+        delta BIGINT;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            SELECT COUNT(*) INTO delta FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT -COUNT(*) INTO delta FROM old_rows;
+        ELSE
+            EXECUTE format('UPDATE dashboard_stats SET %I = 0, updated_at = now() WHERE id = 1', TG_ARGV[0]);
+            RETURN NULL;
+        END IF;
+        IF delta <> 0 THEN
+            EXECUTE format('UPDATE dashboard_stats SET %1$I = %1$I + $1, updated_at = now() WHERE id = 1', TG_ARGV[0])
+            USING delta;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Sayılan tablo -> dashboard_stats kolonu
+COUNTED_TABLES = {"feeds": "total_sources", "agent_memory": "total_intel"}
+
+def _trigger_ddl(table, column):
+    # Statement-level + transition table: toplu INSERT tek UPDATE demek
+    return {
+        f"{table}_stats_insert": f"""CREATE TRIGGER {table}_stats_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE dashboard_stats_count('{column}');""",
+        f"{table}_stats_delete": f"""CREATE TRIGGER {table}_stats_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE dashboard_stats_count('{column}');""",
+        f"{table}_stats_truncate": f"""CREATE TRIGGER {table}_stats_truncate AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE PROCEDURE dashboard_stats_count('{column}');""",
+    }
+
+def ensure_stats_table():
+    """
+    Creates the counters table and installs the count function/triggers where they are
+    missing. A table is recounted only when its triggers were just installed: CREATE TRIGGER
+    blocks writes to it until this transaction commits, so that recount is exact. Once
+    installed, a restart only reads the catalog (no DDL, no table locks, no COUNT(*)).
+    Returns the list of tables being counted.
+    """
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            for cmd in STATS_DDL:
+                cur.execute(cmd)
+            db.lock_for_install(cur, "dashboard_stats")
+            cur.execute("SELECT to_regprocedure('dashboard_stats_count()') IS NULL")
+            if cur.fetchone()[0]:
+                cur.execute(STATS_FUNCTION_DDL)
+            counted = []
+            for table, column in COUNTED_TABLES.items():
+                cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+                if not cur.fetchone()[0]:
+                    continue
+                triggers = _trigger_ddl(table, column)
+                missing = db.missing_triggers(cur, table, triggers)
+                if missing:
+                    for name in missing:
+                        cur.execute(triggers[name])
+                    cur.execute(f"UPDATE dashboard_stats SET {column} = (SELECT COUNT(*) FROM {table}) WHERE id = 1")
+                counted.append(table)
+            cur.close()
+        return counted
+    except Exception as e:
+        print(f"Stats Table Error: {e}")
+        return []
+
+def set_top_trend(topic):
+    """Stores the dominant term computed by the ingestion pipeline."""
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("UPDATE dashboard_stats SET top_trend = %s, updated_at = now() WHERE id = 1", (topic,))
+            cur.close()
+    except Exception as e:
+        print(f"Top Trend Store Error: {e}")
+
+def get_stats():
+    """Dashboard payload: one primary-key read plus the 5 newest memories (created_at index)."""
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT total_sources, total_intel, top_trend FROM dashboard_stats WHERE id = 1")
+            total_sources, total_intel, top_trend = cur.fetchone()
+
+            # Son Haberler
+            recent_alerts = []
+            try:
+                cur.execute("""
+                    SELECT COALESCE(title, left(content, 50)), created_at, impact_score
+                    FROM agent_memory ORDER BY created_at DESC LIMIT 5
+                """)
+                for r in cur.fetchall():
+                    title = r[0][:50] + "..." if r[0] and len(r[0]) > 50 else (r[0] or "Signal")
+                    recent_alerts.append({"title": title, "time": str(r[1]), "impact_score": r[2]})
+            except Exception as e:
+                print(f"Recent Alerts Error: {e}")
+            cur.close()
+
+            return {
+                "total_sources": total_sources,
+                "total_intel": total_intel,
+                "top_trend": top_trend or "WAITING DATA...",
+                "system_status": "OPTIMIZED",
+                "recent_alerts": recent_alerts
+            }
+    except Exception as e:
+        print(f"Stats Error: {e}")
+        return cache_service.uncached({"total_sources": 0, "total_intel": 0, "top_trend": "OFFLINE", "system_status": "ERROR", "recent_alerts": []})
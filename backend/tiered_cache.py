@@ -0,0 +1,102 @@
+from psycopg2.extras import execute_values
+import db
+from cache_service import LRUCache
+
+def ensure_table(ddl, label):
+    """Runs a cache table's CREATE statements; label names it in error logs."""
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            for cmd in ddl:
+                cur.execute(cmd)
+            cur.close()
+        return True
+    except Exception as e:
+        print(f"{label} Cache Table Error: {e}")
+        return False
+
+class TieredCache:
+    """
+    In-process LRU in front of a Postgres table keyed by a content hash (key TEXT PRIMARY KEY).
+
+    - get_cached: memory tier only (no I/O, safe to call on the event loop)
+    - lookup / lookup_many: memory, then Postgres; Postgres hits are promoted to memory
+    - store / store_many: both tiers. Keys hash the model and the full input, so a row already
+      in Postgres is an equally good value: writes are INSERT ... ON CONFLICT DO NOTHING.
+
+    Extra columns (model, task_type, ...) are passed to store as keyword arguments.
+    encode converts a value for the value column; copy is applied to every value handed out
+    (e.g. dict, so callers can't mutate what the memory tier holds).
+    """
+
+    def __init__(self, table, column, label, max_entries, enabled=True, encode=None, copy=None):
+        self.table = table
+        self.column = column
+        self.label = label
+        self.enabled = enabled
+        self.memory = LRUCache(max_entries)
+        self._encode = encode or (lambda value: value)
+        self._copy = copy or (lambda value: value)
+
+    def get_cached(self, key):
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        return self._copy(value) if value is not None else None
+
+    def lookup(self, key):
+        return self.lookup_many([key]).get(key)
+
+    def lookup_many(self, keys):
+        """{key: value} for every key found in either tier."""
+        if not self.enabled or not keys:
+            return {}
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.memory.get(key)
+            if value is not None:
+                found[key] = self._copy(value)
+            else:
+                missing.append(key)
+        if not missing:
+            return found
+        try:
+            with db.get_connection() as conn:
+                cur = conn.cursor()
+                cur.execute(f"SELECT key, {self.column} FROM {self.table} WHERE key = ANY(%s)", (missing,))
+                rows = cur.fetchall()
+                cur.close()
+        except Exception as e:
+            print(f"{self.label} Cache Read Error: {e}")
+            return found
+        for key, value in rows:
+            self.memory.set(key, value)
+            found[key] = self._copy(value)
+        return found
+
+    def store(self, key, value, **columns):
+        self.store_many({key: value}, **columns)
+
+    def store_many(self, entries, **columns):
+        """entries: {key: value}. One INSERT statement for the whole batch; empty values are skipped."""
+        if not self.enabled:
+            return
+        entries = {key: value for key, value in entries.items() if value}
+        if not entries:
+            return
+        names = list(columns)
+        rows = []
+        for key, value in entries.items():
+            self.memory.set(key, self._copy(value))
+            rows.append((key, *[columns[name] for name in names], self._encode(value)))
+        try:
+            with db.get_connection() as conn:
+                cur = conn.cursor()
+                execute_values(cur, f"""
+                    INSERT INTO {self.table} (key, {", ".join(names + [self.column])}) VALUES %s
+                    ON CONFLICT (key) DO NOTHING
+                """, rows, page_size=len(rows))
+                cur.close()
+        except Exception as e:
+            print(f"{self.label} Cache Write Error: {e}")
@@ -1,55 +1,154 @@
+import os
 import re
+import datetime
 from collections import Counter
-import random
+from psycopg2.extras import execute_values
+import db
+import cache_service
+
+# --- CONFIG ---
+# "Şimdi" penceresi ve karşılaştırılan geçmiş (baseline) penceresi, saat cinsinden
+TREND_WINDOW_HOURS = int(os.getenv("TREND_WINDOW_HOURS", "6"))
+TREND_BASELINE_HOURS = int(os.getenv("TREND_BASELINE_HOURS", "48"))
+TREND_TOP_K = int(os.getenv("TREND_TOP_K", "10"))
+# Spike: pencerede en az bu kadar haber ve baseline hızının en az bu yüzde kadar üstü
+TREND_SPIKE_MIN_COUNT = int(os.getenv("TREND_SPIKE_MIN_COUNT", "3"))
+TREND_SPIKE_VELOCITY = int(os.getenv("TREND_SPIKE_VELOCITY", "100"))
 
 # Common stopwords to ignore
 STOPWORDS = {
-    'the', 'a', 'an', 'in', 'on', 'at', 'for', 'to', 'of', 'and', 'or', 'is', 'are', 'was', 'were', 
+    'the', 'a', 'an', 'in', 'on', 'at', 'for', 'to', 'of', 'and', 'or', 'is', 'are', 'was', 'were',
     'with', 'by', 'from', 'as', 'it', 'this', 'that', 'new', 'how', 'why', 'what', 'updates', 'daily',
     'more', 'about', 'can', 'will', 'not', 'be', 'has', 'have', 'news', 'report', 'video', 'post'
 }
 
+# Bu terimler için spike eşiği yarıya iner (daha erken alarm)
 CRITICAL_KEYWORDS = {'ZERO-DAY', 'RANSOMWARE', 'BREACH', 'VULNERABILITY', 'ATTACK', 'APT', 'MALWARE', 'EXPLOIT'}
 
-def analyze_trends(articles):
+TREND_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS trend_buckets (
+        term TEXT NOT NULL,
+        bucket TIMESTAMP NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (term, bucket)
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_trend_buckets_bucket ON trend_buckets(bucket);",
+]
+
+_WORD_RE = re.compile(r'\b\w+(?:-\w+)*\b')
+
+def extract_terms(article):
+    """Distinct trend terms of one article (title + summary), so a term counts once per article."""
+    text = f"{article.get('title') or ''} {article.get('summary') or ''}".lower()
+    # Kritik terimler kısa da olsa sayılır ('APT')
+    return {w for w in _WORD_RE.findall(text) if w not in STOPWORDS and (len(w) > 3 or w.upper() in CRITICAL_KEYWORDS)}
+
+def _bucket(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def ensure_trend_table():
+    """Creates the bucket table; an empty table is seeded from recently stored articles."""
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            for cmd in TREND_DDL:
+                cur.execute(cmd)
+            cur.execute("SELECT EXISTS (SELECT 1 FROM trend_buckets)")
+            seeded = cur.fetchone()[0]
+            if not seeded:
+                cur.execute("SELECT to_regclass('articles') IS NOT NULL")
+                if cur.fetchone()[0]:
+                    cur.execute(
+                        "SELECT title, summary, fetched_at FROM articles WHERE fetched_at >= %s",
+                        (_bucket(datetime.datetime.now()) - datetime.timedelta(hours=TREND_WINDOW_HOURS + TREND_BASELINE_HOURS),)
+                    )
+                    articles = [{"title": r[0], "summary": r[1], "fetched_at": r[2]} for r in cur.fetchall()]
+                    record_articles(cur, articles)
+            cur.close()
+        return True
+    except Exception as e:
+        print(f"Trend Table Error: {e}")
+        return False
+
+def record_articles(cur, articles, now=None):
     """
-    Analyzes a list of articles to find trending keywords and simulate velocity.
+    Adds newly ingested articles to the hourly term buckets and prunes buckets
+    that fell out of the baseline. Runs on the caller's cursor so the counts
+    commit together with the articles.
     """
-    text_blob = ""
+    now = now or datetime.datetime.now()
+    cur.execute(
+        "DELETE FROM trend_buckets WHERE bucket < %s",
+        (_bucket(now) - datetime.timedelta(hours=TREND_WINDOW_HOURS + TREND_BASELINE_HOURS),)
+    )
+    counts = Counter()
     for art in articles:
-        text_blob += f" {art.get('title', '')} {art.get('summary', '')}"
-    
-    # Clean and tokenize
-    words = re.findall(r'\b\w+\b', text_blob.lower())
-    
-    # Filter stopwords and short words
-    filtered_words = [w for w in words if w not in STOPWORDS and len(w) > 3]
-    
-    # Count frequency
-    counts = Counter(filtered_words)
-    
-    # Get top 20
-    top_common = counts.most_common(20)
-    
+        bucket = _bucket(art.get("fetched_at") or now)
+        for term in extract_terms(art):
+            counts[(term, bucket)] += 1
+    if not counts:
+        return 0
+    execute_values(cur, """
+        INSERT INTO trend_buckets (term, bucket, count) VALUES %s
+        ON CONFLICT (term, bucket) DO UPDATE SET count = trend_buckets.count + EXCLUDED.count
+    """, [(term, bucket, n) for (term, bucket), n in counts.items()])
+    return len(counts)
+
+def compute_trends(rows, window_hours=TREND_WINDOW_HOURS, baseline_hours=TREND_BASELINE_HOURS, top_k=TREND_TOP_K):
+    """
+    Ranks (term, window_count, baseline_count) rows.
+    velocity = % change of the per-hour rate in the window against the baseline rate;
+    a term never seen in the baseline is treated as one mention across the baseline.
+    With no baseline at all (fresh install) nothing is flagged as a spike.
+    """
+    has_history = any(baseline for _, _, baseline in rows)
     trends = []
-    for word, count in top_common:
-        # Simulate velocity/trend change for the UI effect since we don't have historical db yet
-        # In a real system, this would compare t(now) vs t(yesterday)
-        velocity = random.randint(-20, 150)
-        direction = 'up' if velocity >= 0 else 'down'
-        
-        is_critical = word.upper() in CRITICAL_KEYWORDS or velocity > 100
-        
+    for term, current, baseline in rows:
+        if not current:
+            continue
+        current_rate = current / window_hours
+        baseline_rate = max(baseline, 1) / baseline_hours
+        velocity = round((current_rate - baseline_rate) / baseline_rate * 100)
+        topic = term.upper()
+        threshold = TREND_SPIKE_VELOCITY / 2 if topic in CRITICAL_KEYWORDS else TREND_SPIKE_VELOCITY
+        min_count = max(1, TREND_SPIKE_MIN_COUNT // 2) if topic in CRITICAL_KEYWORDS else TREND_SPIKE_MIN_COUNT
         trends.append({
-            "topic": word.upper(),
-            "count": count,
+            "topic": topic,
+            "count": current,
             "velocity": abs(velocity),
-            "direction": direction,
-            "is_critical": is_critical
+            "direction": 'up' if velocity >= 0 else 'down',
+            "is_critical": has_history and current >= min_count and velocity >= threshold
         })
-        
-    # Always inject a few critical cyber terms if not found (for demo/flavor)
-    if not any(t['is_critical'] for t in trends):
-        trends.insert(0, {"topic": "ZERO-DAY", "count": 5, "velocity": 85, "direction": "up", "is_critical": True})
-        
-    return trends[:10]
+
+    # Spike'lar önce, sonra penceredeki hacim
+    trends.sort(key=lambda t: (t["is_critical"], t["count"], t["velocity"] if t["direction"] == 'up' else -t["velocity"]), reverse=True)
+    return trends[:top_k]
+
+def get_trends(now=None):
+    """
+    Current top-k trends from the bucket table.
+    Only the window + baseline hours are read (one grouped scan over the bucket index).
+    """
+    now = now or datetime.datetime.now()
+    window_start = _bucket(now) - datetime.timedelta(hours=TREND_WINDOW_HOURS - 1)
+    baseline_start = window_start - datetime.timedelta(hours=TREND_BASELINE_HOURS)
+    try:
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT term,
+                       SUM(count) FILTER (WHERE bucket >= %(window)s) AS current,
+                       COALESCE(SUM(count) FILTER (WHERE bucket < %(window)s), 0) AS baseline
+                FROM trend_buckets
+                WHERE bucket >= %(baseline)s
+                GROUP BY term
+                HAVING SUM(count) FILTER (WHERE bucket >= %(window)s) > 0
+            """, {"window": window_start, "baseline": baseline_start})
+            rows = cur.fetchall()
+            cur.close()
+        return compute_trends(rows)
+    except Exception as e:
+        print(f"Trend Read Error: {e}")
+        return cache_service.uncached([])
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import db
+from memory_service import EMBEDDING_DIM, is_placeholder_vector
+
+# --- CONFIG ---
+# Snapshot dizini (Cloud Run'da yazılabilir tek yer /tmp)
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "/tmp/nomad_vector_index")
+# Arama öncesi en fazla bu sıklıkta DB'den yeni kayıtlar çekilir (diğer instance'ların /save'leri için)
+VECTOR_INDEX_SYNC_SECONDS = float(os.getenv("VECTOR_INDEX_SYNC_SECONDS", "30"))
+# Bu kadar yeni kayıttan sonra snapshot diske yazılır
+VECTOR_INDEX_FLUSH_EVERY = int(os.getenv("VECTOR_INDEX_FLUSH_EVERY", "20"))
+# Serial id'ler commit sırasına göre değil ayırma sırasına göre gelir: artımlı sync en büyük
+# id'nin bu kadar altından tekrar okur, geç commit olan kayıtlar da yakalanır
+VECTOR_INDEX_SYNC_OVERLAP = int(os.getenv("VECTOR_INDEX_SYNC_OVERLAP", "256"))
+
+VECTORS_FILE = "vectors.f32"
+META_FILE = "meta.json"
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def _parse_vector(text):
+    # pgvector metni ('[0.1,0.2]') ve eski Python list repr'i ('[0.1, 0.2]') ikisi de geçerli JSON
+    return json.loads(text)
+
+class VectorIndex:
+    """
+    Exact cosine top-k over an in-memory float32 matrix of normalized memory embeddings.
+    Rows are appended in place (capacity doubles), so /save never rebuilds the matrix.
+    Snapshots go to a raw float32 file that is memory-mapped back on restart.
+    Membership is tracked as a set of ids, so rows may arrive in any id order.
+    """
+
+    def __init__(self, directory=VECTOR_INDEX_DIR):
+        self.directory = directory
+        self.dim = None
+        self._matrix = None
+        self._ids = []
+        self._id_set = set()
+        self._max_id = 0
+        self._contents = []
+        self._count = 0
+        self._unflushed = 0
+        self._last_sync = 0.0
+        # İlk DB yüklemesi başarılı olana kadar /save'ler index'e yazılmaz (sync hepsini getirir)
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def max_id(self):
+        return self._max_id
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def _reset(self):
+        """Caller holds the lock."""
+        self.dim, self._matrix, self._ids, self._contents, self._count = None, None, [], [], 0
+        self._id_set, self._max_id = set(), 0
+
+    def _append(self, rows):
+        """rows: [(id, content, vector)] not indexed yet. Caller holds the lock."""
+        rows = [r for r in rows if r[0] not in self._id_set]
+        if not rows:
+            return
+        vectors = _normalize(np.asarray([r[2] for r in rows], dtype=np.float32))
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._matrix = np.empty((max(64, len(rows)), self.dim), dtype=np.float32)
+        needed = self._count + len(rows)
+        if needed > self._matrix.shape[0]:
+            grown = np.empty((max(needed, self._matrix.shape[0] * 2), self.dim), dtype=np.float32)
+            grown[:self._count] = self._matrix[:self._count]
+            self._matrix = grown
+        self._matrix[self._count:needed] = vectors
+        self._ids.extend(r[0] for r in rows)
+        self._id_set.update(r[0] for r in rows)
+        self._max_id = max(self._max_id, max(r[0] for r in rows))
+        self._contents.extend(r[1] for r in rows)
+        self._count = needed
+        self._unflushed += len(rows)
+
+    # --- LOADING ---
+
+    def load_snapshot(self):
+        """Maps the last snapshot back in. Returns False if there is none (or it's unreadable)."""
+        meta_path = os.path.join(self.directory, META_FILE)
+        vectors_path = os.path.join(self.directory, VECTORS_FILE)
+        if not (os.path.exists(meta_path) and os.path.exists(vectors_path)):
+            return False
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            count, dim = meta["count"], meta["dim"]
+            mapped = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(count, dim))
+            # Eski snapshot'larda kalmış sabit (placeholder) vektörler atılır
+            keep = np.flatnonzero(mapped.max(axis=1) != mapped.min(axis=1))
+            kept = len(keep)
+            with self._lock:
+                self.dim = dim
+                self._matrix = np.empty((max(64, kept * 2), dim), dtype=np.float32)
+                self._matrix[:kept] = mapped[keep]
+                self._ids = [meta["ids"][i] for i in keep]
+                self._id_set = set(self._ids)
+                self._max_id = max(self._ids, default=0)
+                self._contents = [meta["contents"][i] for i in keep]
+                self._count = kept
+                # Satır atıldıysa bir sonraki flush snapshot'ı yeniden yazar
+                self._unflushed = count - kept
+            del mapped
+            return True
+        except Exception as e:
+            print(f"Vector Index Snapshot Error: {e}")
+            return False
+
+    def sync_from_db(self, full=False):
+        """
+        Pulls rows from VECTOR_INDEX_SYNC_OVERLAP ids below the newest indexed id on
+        (or everything when full=True / rows were deleted); ids already indexed are skipped.
+        Marks the index loaded. Returns the number of rows added.
+        """
+        with db.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT COUNT(*) FROM agent_memory WHERE embedding IS NOT NULL")
+            db_count = cur.fetchone()[0]
+            if db_count < self._count:
+                full = True
+            after_id = 0 if full else max(0, self.max_id - VECTOR_INDEX_SYNC_OVERLAP)
+            cur.execute("""
+                SELECT id, content, embedding::text FROM agent_memory
+                WHERE embedding IS NOT NULL AND id > %s
+                ORDER BY id
+            """, (after_id,))
+            fetched = cur.fetchall()
+            cur.close()
+
+        rows = []
+        for mem_id, content, embedding in fetched:
+            try:
+                rows.append((mem_id, content, _parse_vector(embedding)))
+            except ValueError:
+                continue
+        # Placeholder / yanlış boyutlu vektörler index'e girmez (backfill'in aradığı satırlar)
+        dim = EMBEDDING_DIM if full or self.dim is None else self.dim
+        rows = [r for r in rows if len(r[2]) == dim and not is_placeholder_vector(r[2])]
+
+        with self._lock:
+            if full:
+                self._reset()
+            before = self._count
+            self._append(rows)
+            self._last_sync = time.monotonic()
+            self._loaded = True
+            return self._count - before
+
+    def maybe_sync(self):
+        """
+        Cheap incremental catch-up, at most every VECTOR_INDEX_SYNC_SECONDS.
+        If the startup load failed, this retries it as a full load.
+        """
+        if time.monotonic() - self._last_sync < VECTOR_INDEX_SYNC_SECONDS:
+            return
+        try:
+            if self.sync_from_db(full=not self._loaded):
+                self.maybe_flush()
+        except Exception as e:
+            self._last_sync = time.monotonic()
+            print(f"Vector Index Sync Error: {e}")
+
+    # --- WRITES ---
+
+    def add(self, mem_id, content, vector):
+        """
+        Indexes a freshly saved memory (any id order). Ignored until the index has loaded
+        from the DB; the load then picks the row up itself.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            if self.dim is not None and len(vector) != self.dim:
+                return
+            self._append([(mem_id, content, vector)])
+        self.maybe_flush()
+
+    def rebuild(self):
+        """
+        Full reload from the DB for rows changed in place (e.g. re-embedded by the backfill),
+        which the id-based incremental sync can't see. The snapshot is rewritten or removed.
+        Returns the number of indexed rows.
+        """
+        added = self.sync_from_db(full=True)
+        if added:
+            self.flush()
+        else:
+            self.delete_snapshot()
+        return added
+
+    def delete_snapshot(self):
+        for name in (VECTORS_FILE, META_FILE):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def maybe_flush(self):
+        if self._unflushed >= VECTOR_INDEX_FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        """Writes the snapshot atomically (temp file + rename)."""
+        with self._lock:
+            if self._count == 0 or self._unflushed == 0:
+                return
+            matrix = self._matrix[:self._count].copy()
+            meta = {"dim": self.dim, "count": self._count, "ids": list(self._ids), "contents": list(self._contents)}
+            self._unflushed = 0
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            vectors_tmp = os.path.join(self.directory, VECTORS_FILE + ".tmp")
+            meta_tmp = os.path.join(self.directory, META_FILE + ".tmp")
+            matrix.tofile(vectors_tmp)
+            with open(meta_tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(vectors_tmp, os.path.join(self.directory, VECTORS_FILE))
+            os.replace(meta_tmp, os.path.join(self.directory, META_FILE))
+        except Exception as e:
+            print(f"Vector Index Flush Error: {e}")
+
+    # --- SEARCH ---
+
+    def search(self, query_vector, k=3):
+        """Returns [(id, content, score)] for the k most similar memories (cosine, best first)."""
+        with self._lock:
+            count = self._count
+            if count == 0:
+                return []
+            matrix = self._matrix[:count]
+            ids = self._ids
+            contents = self._contents
+        query = np.asarray(query_vector, dtype=np.float32)
+        if query.shape[0] != matrix.shape[1]:
+            return []
+        scores = matrix @ _normalize(query)
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], contents[i], float(scores[i])) for i in top]
+
+# Process-wide index
+index = VectorIndex()
+
+def load():
+    """Startup: snapshot first (fast), then catch up with rows saved since."""
+    restored = index.load_snapshot()
+    try:
+        added = index.sync_from_db()
+        index.flush()
+        print(f"🧭 Vector index ready: {len(index)} memories ({'snapshot' if restored else 'db'} + {added} new).")
+    except Exception as e:
+        print(f"Vector Index Load Error: {e}")
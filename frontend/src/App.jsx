@@ -87,7 +87,10 @@ const App = () => {
     : 'https://nomad-backend-xxs2tligqa-ew.a.run.app';
 
   // Graph Refs & D3 Tuning
+  const feedStreamRef = useRef(null);
   const graphRef = useRef();
+  const graphVersionRef = useRef(null); // Son alınan graf versiyonu (?since= delta'ları için)
+  const graphLodRef = useRef(null); // Ekrandaki detay seviyesi (delta'lar buna göre üretilir)
   const containerRef = useRef();
   const [dimensions, setDimensions] = useState({ width: 800, height: 600 });
 
@@ -142,23 +145,64 @@ const App = () => {
   };
 
   const fetchNews = async () => {
+    if (feedStreamRef.current) feedStreamRef.current.close();
     setLoadingFeeds(true);
     try {
       const res = await fetch(`${API_URL}/feeds?category=${activeTab}`);
       const data = await res.json();
+      // Depo henüz boşsa (ilk açılış) canlı akışa geç
+      if (Array.isArray(data) && data.length === 0) return fetchNewsStream();
       setArticles(data);
     } catch (error) { console.error("RSS Err:", error); }
-    finally { setLoadingFeeds(false); }
+    setLoadingFeeds(false);
+  };
+
+  // Canlı tarama: her feed bitince kartları SSE ile ekler
+  const fetchNewsStream = () => {
+    if (feedStreamRef.current) feedStreamRef.current.close();
+    setArticles([]);
+    setLoadingFeeds(true);
+
+    const source = new EventSource(`${API_URL}/feeds/stream?category=${activeTab}`);
+    feedStreamRef.current = source;
+    source.onmessage = (e) => {
+      const batch = JSON.parse(e.data);
+      setArticles(prev => [...prev, ...batch]);
+    };
+    source.addEventListener('done', () => { source.close(); setLoadingFeeds(false); });
+    source.onerror = () => { source.close(); setLoadingFeeds(false); };
   };
 
   const fetchGraphData = async () => {
     try {
-      const res = await fetch(`${API_URL}/graph-data`);
+      // İlk yüklemede tam graf, sonra sadece değişiklikler (delta)
+      const since = graphVersionRef.current;
+      const query = since !== null ? `?since=${since}&lod=${graphLodRef.current || 'auto'}` : '';
+      const res = await fetch(`${API_URL}/graph-data${query}`);
       const data = await res.json();
-      setGraphData(data);
+      graphVersionRef.current = data.version ?? null;
+      graphLodRef.current = data.lod ?? null;
+      if (data.delta) setGraphData(prev => applyGraphDelta(prev, data));
+      else setGraphData(data);
     } catch (e) { console.error("Graph Err", e); }
   };
 
+  // Süper-node'a tıklanınca cluster'ı üyeleriyle değiştir
+  const expandCluster = async (clusterNode) => {
+    try {
+      const res = await fetch(`${API_URL}/graph-data/cluster/${clusterNode.cluster_id}`);
+      const data = await res.json();
+      setGraphData(prev => {
+        const nodes = prev.nodes.filter(n => n.id !== clusterNode.id);
+        const ids = new Set(nodes.map(n => n.id));
+        data.nodes.forEach(n => { if (!ids.has(n.id)) { nodes.push(n); ids.add(n.id); } });
+        const links = prev.links.filter(l => linkEnd(l.source) !== clusterNode.id && linkEnd(l.target) !== clusterNode.id);
+        data.links.forEach(l => { if (ids.has(l.source) && ids.has(l.target)) links.push(l); });
+        return { ...prev, nodes, links };
+      });
+    } catch (e) { console.error("Cluster Err", e); }
+  };
+
   const handleArticleClick = async (article) => {
     setSelectedArticle(article);
     setAnalysis(null);
@@ -177,15 +221,24 @@ const App = () => {
 
   const handleSaveToMemory = async () => {
     if (!analysis) return;
-    const tagString = analysis.tags ? analysis.tags.join(", ") : "GENERAL";
+    const tagString = Array.isArray(analysis.tags) ? analysis.tags.join(", ") : (analysis.tags || "GENERAL");
     const textToSave = `${selectedArticle.title} | Tags: ${tagString} | Insight: ${analysis.aiInsight} | Link: ${selectedArticle.link}`;
 
     try {
-      await fetch(`${API_URL}/save`, {
+      const res = await fetch(`${API_URL}/save`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ text: textToSave })
+        body: JSON.stringify({
+          text: textToSave,
+          title: selectedArticle.title,
+          tags: analysis.tags,
+          insight: analysis.aiInsight,
+          link: selectedArticle.link,
+          impact_score: analysis.impact_score,
+          trend_label: analysis.trend_label
+        })
       });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
       alert("Memory Block Encrypted & Saved.");
       if (view === 'graph') fetchGraphData();
     } catch (e) { alert("Save failed."); }
@@ -292,14 +345,41 @@ const App = () => {
     setChatInput('');
     setChatLoading(true);
 
+    // Cevap /ask/stream üzerinden token token gelir; son AI mesajı büyütülür
+    const appendToAnswer = (text) => setChatHistory(prev => {
+      const last = prev[prev.length - 1];
+      if (last && last.role === 'ai' && last.streaming) {
+        return [...prev.slice(0, -1), { ...last, content: last.content + text }];
+      }
+      return [...prev, { role: 'ai', content: text, streaming: true }];
+    });
+
     try {
-      const res = await fetch(`${API_URL}/ask`, {
+      const res = await fetch(`${API_URL}/ask/stream`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ question: userMsg })
       });
-      const data = await res.json();
-      setChatHistory(prev => [...prev, { role: 'ai', content: data.answer }]);
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const evt of events) {
+          if (evt.startsWith('event: done')) continue;
+          const dataLine = evt.split('\n').find(l => l.startsWith('data: '));
+          if (!dataLine) continue;
+          setChatLoading(false);
+          appendToAnswer(JSON.parse(dataLine.slice(6)).token);
+        }
+      }
+      setChatHistory(prev => prev.map(m => m.streaming ? { role: m.role, content: m.content } : m));
     } catch (e) {
       setChatHistory(prev => [...prev, { role: 'ai', content: "Connection lost." }]);
     } finally {
@@ -326,15 +406,24 @@ const App = () => {
   const handleSaveScan = async () => {
     if (!scanResult) return;
 
-    const tagString = scanResult.tags ? scanResult.tags.join(", ") : "GENERAL";
+    const tagString = Array.isArray(scanResult.tags) ? scanResult.tags.join(", ") : (scanResult.tags || "GENERAL");
     const textToSave = `${scanResult.title} | Tags: ${tagString} | Insight: ${scanResult.aiInsight} | Link: ${scanResult.link}`;
 
     try {
-      await fetch(`${API_URL}/save`, {
+      const res = await fetch(`${API_URL}/save`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ text: textToSave })
+        body: JSON.stringify({
+          text: textToSave,
+          title: scanResult.title,
+          tags: scanResult.tags,
+          insight: scanResult.aiInsight,
+          link: scanResult.link,
+          impact_score: scanResult.impact_score,
+          trend_label: scanResult.trend_label
+        })
       });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
       alert("Intelligence Encrypted & Stored.");
       setScanUrl('');
       setScanResult(null);
@@ -344,6 +433,35 @@ const App = () => {
 
   // --- GRAPH MANTIKLARI (Filtreleme & Renk) ---
 
+  // ForceGraph link uçlarını node objesine çevirir; id'yi her iki durumda da al
+  const linkEnd = (end) => (typeof end === 'object' ? end.id : end);
+  const linkKey = (l) => [linkEnd(l.source), linkEnd(l.target)].sort().join('|');
+
+  // Delta'yı mevcut grafa uygula. Var olan node objeleri korunur (yerleşim zıplamaz);
+  // aynı delta iki kez gelse de sonuç değişmez. Kapalı bir cluster'ın yeni üyeleri
+  // cluster açılınca gelir.
+  const applyGraphDelta = (prev, delta) => {
+    const removedNodes = new Set(delta.nodes_removed);
+    const removedLinks = new Set(delta.links_removed.map(linkKey));
+    const nodes = prev.nodes.filter(n => !removedNodes.has(n.id));
+    const ids = new Set(nodes.map(n => n.id));
+    delta.nodes_added.forEach(n => {
+      if (ids.has(n.id) || ids.has(`cluster:${n.cluster_id}`)) return;
+      nodes.push(n);
+      ids.add(n.id);
+    });
+    const links = prev.links.filter(l =>
+      !removedLinks.has(linkKey(l)) && ids.has(linkEnd(l.source)) && ids.has(linkEnd(l.target))
+    );
+    const linkKeys = new Set(links.map(linkKey));
+    delta.links_added.forEach(l => {
+      if (linkKeys.has(linkKey(l)) || !ids.has(l.source) || !ids.has(l.target)) return;
+      links.push(l);
+      linkKeys.add(linkKey(l));
+    });
+    return { ...prev, nodes, links };
+  };
+
   // 1. Düğüm Rengi Belirle
   const getNodeColor = (node) => {
     if (!node.tags || node.tags.length === 0) return TAG_COLORS.DEFAULT;
@@ -386,9 +504,13 @@ const App = () => {
     return { nodes, links };
   }, [graphData, filterTag, searchQuery]);
 
+  // Yapılandırılmış alanlar yoksa (eski kayıtlar) content metninden ayrıştır
+  const getNodeInsight = (node) => node.insight || node.full_content?.split('| Insight: ')[1]?.split('|')[0] || '';
+  const getNodeLink = (node) => node.link || node.full_content?.split('| Link: ')[1]?.trim() || '';
+
   // Helper to extract insight for hover
   const getHoverLabel = (node) => {
-    const insight = node.full_content.split('| Insight: ')[1]?.split('|')[0] || '';
+    const insight = getNodeInsight(node);
     return `${node.label}\n\n${insight.substring(0, 100)}${insight.length > 100 ? '...' : ''}`;
   };
 
@@ -610,13 +732,22 @@ const App = () => {
                 <span className="text-xs font-bold text-white tracking-[0.2em]">SIGNAL GRID</span>
                 <span className="px-2 py-0.5 rounded bg-white/5 text-[10px] font-mono text-gray-500">{articles.length} UNITS</span>
               </div>
-              <button
-                onClick={() => setShowModal(true)}
-                className="p-2 rounded bg-cyber-primary/10 border border-cyber-primary/20 text-cyber-primary hover:bg-cyber-primary hover:text-black transition-all"
-                title="Add New Neural Link (RSS)"
-              >
-                <Plus size={16} />
-              </button>
+              <div className="flex items-center gap-2">
+                <button
+                  onClick={fetchNewsStream}
+                  className="p-2 rounded bg-cyber-primary/10 border border-cyber-primary/20 text-cyber-primary hover:bg-cyber-primary hover:text-black transition-all"
+                  title="Live Scan (Stream All Feeds)"
+                >
+                  <Zap size={16} />
+                </button>
+                <button
+                  onClick={() => setShowModal(true)}
+                  className="p-2 rounded bg-cyber-primary/10 border border-cyber-primary/20 text-cyber-primary hover:bg-cyber-primary hover:text-black transition-all"
+                  title="Add New Neural Link (RSS)"
+                >
+                  <Plus size={16} />
+                </button>
+              </div>
             </div>
 
             {/* Mobile Header for Categories */}
@@ -739,6 +870,10 @@ const App = () => {
                 linkDirectionalParticleSpeed={0.005}
                 onNodeClick={node => {
                   console.log("Clicked:", node);
+                  if (node.group === 'cluster') {
+                    expandCluster(node);
+                    return;
+                  }
                   setSelectedNode(node);
                   if (graphRef.current) {
                     graphRef.current.centerAt(node.x, node.y, 1000);
@@ -786,7 +921,7 @@ const App = () => {
                   <div className="bg-cyber-bg/50 p-6 rounded-xl border border-cyber-border">
                     <h3 className="text-xs font-mono text-cyber-text/50 uppercase mb-3 flex items-center gap-2"><Sparkles size={12} /> Analysis & Insight</h3>
                     <p className="text-sm text-cyber-textLight whitespace-pre-wrap leading-relaxed">
-                      {(selectedNode.full_content?.split('| Insight: ')[1]?.split('|')[0] || selectedNode.full_content?.split('|')[0]) || "No details available."}
+                      {(getNodeInsight(selectedNode) || selectedNode.full_content?.split('|')[0]) || "No details available."}
                     </p>
                   </div>
 
@@ -795,9 +930,9 @@ const App = () => {
                       <Zap size={14} /> RE-ANALYZE
                     </button>
 
-                    {selectedNode.full_content.includes('| Link:') && (
+                    {getNodeLink(selectedNode) && (
                       <a
-                        href={selectedNode.full_content.split('| Link: ')[1]?.trim()}
+                        href={getNodeLink(selectedNode)}
                         target="_blank"
                         rel="noreferrer"
                         className="py-3 bg-cyber-primary text-black font-bold rounded-lg hover:bg-cyan-300 transition-colors text-xs flex items-center justify-center gap-2"
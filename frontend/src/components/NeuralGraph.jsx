@@ -8,7 +8,8 @@ const NeuralGraph = ({ data, onNodeClick, width, height }) => {
     useEffect(() => {
         if (data && data.nodes && data.nodes.length > 0) {
             // Transform data for vis-network
-            // Backend returns { nodes: [], links: [] }
+            // Backend returns { nodes: [], links: [] }; ids are stable across deltas,
+            // so react-graph-vis only patches the nodes/edges that changed
             const edges = (data.links || []).map(link => {
                 const sourceId = typeof link.source === 'object' ? link.source.id : link.source;
                 const targetId = typeof link.target === 'object' ? link.target.id : link.target;
@@ -36,7 +37,8 @@ const NeuralGraph = ({ data, onNodeClick, width, height }) => {
                     id: node.id,
                     label: node.label || node.name || `Node ${node.id}`,
                     shape: 'dot',
-                    size: 15,
+                    // Cluster süper-node'ları üye sayısıyla büyür
+                    size: node.group === 'cluster' ? 10 + node.val : 15,
                     color: tagColors[firstTag] || tagColors.DEFAULT,
                     font: { color: '#fff', face: 'monospace', size: 12 },
                     title: node.full_content || node.label || node.name // Tooltip
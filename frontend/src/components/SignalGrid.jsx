@@ -3,7 +3,8 @@ import NewsCard from './NewsCard';
 import { Loader } from 'lucide-react';
 
 const SignalGrid = ({ articles, loading, onArticleClick }) => {
-    if (loading) {
+    // Akış sırasında gelen kartlar hemen gösterilir; spinner sadece liste boşken
+    if (loading && (!articles || articles.length === 0)) {
         return (
             <div className="h-full flex items-center justify-center">
                 <Loader className="animate-spin text-cyber-primary w-8 h-8" />
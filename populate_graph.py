@@ -1,5 +1,6 @@
 import psycopg2
 import os
+import sys
 import random
 from dotenv import load_dotenv
 from pathlib import Path
@@ -8,6 +9,11 @@ from pathlib import Path
 env_path = Path('backend/.env').absolute()
 load_dotenv(dotenv_path=env_path)
 
+# Backend servislerini kullan (gerçek embedding + pgvector/TEXT uyumlu yazım)
+sys.path.insert(0, str(Path('backend').absolute()))
+import memory_service
+from embedding_service import generate_embeddings
+
 def connect_db():
     try:
         db_url = os.getenv("DB_URL")
@@ -49,13 +55,13 @@ def populate_memory():
         "NASA announces new lunar outpost plans | Tags: SPACE, NASA, FUTURE | Insight: Permanent human presence on Moon by 2030."
     ]
 
-    for mem in memories:
-        cur.execute("INSERT INTO agent_memory (content, embedding) VALUES (%s, %s)", (mem, "[0.1, 0.2]"))
-    
-    conn.commit()
-    print("Added 8 synthetic memory nodes.")
     cur.close()
     conn.close()
 
+    vectors = generate_embeddings(memories)
+    items = [(mem, vector) for mem, vector in zip(memories, vectors) if vector]
+    memory_service.save_memories(items)
+    print(f"Added {len(items)} synthetic memory nodes.")
+
 if __name__ == "__main__":
     populate_memory()